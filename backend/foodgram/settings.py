@@ -35,6 +35,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'user.CustomUser'
 
 MIDDLEWARE = [
+    'recipes.metrics.MetricsMiddleware',
+    'recipes.profiling.SQLProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -113,6 +115,42 @@ DATABASES = {
     }
 }
 
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    default='django.core.cache.backends.filebased.FileBasedCache')
+CACHE_LOCATION = os.getenv('CACHE_LOCATION',
+                           default='/var/tmp/foodgram_cache')
+
+
+def cache_settings(name, max_entries, **params):
+    """ Файловый и локальный кеши у каждого имени свои, с явным
+        ограничением записей: при переполнении удаляется случайная треть,
+        и ограничение должно быть заведомо больше числа нужных записей.
+        memcached общий, записи разделяются префиксом. """
+    if 'memcached' in CACHE_BACKEND:
+        return {'BACKEND': CACHE_BACKEND, 'LOCATION': CACHE_LOCATION,
+                'KEY_PREFIX': name, **params}
+    return {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.path.join(CACHE_LOCATION, name),
+        'OPTIONS': {'MAX_ENTRIES': max_entries, 'CULL_FREQUENCY': 3},
+        **params,
+    }
+
+
+# versions - общие версии справочников, рецептов, пользователей и оценок
+# (единицы записей, вытеснения не бывает); user_state - версии состояния
+# каждого пользователя. Файловый кеш перебирает каталог при каждой записи,
+# поэтому при большом числе пользователей лучше memcached.
+CACHES = {
+    'default': cache_settings('default', 10000),
+    'versions': cache_settings('versions', 1000),
+    'user_state': cache_settings(
+        'user_state',
+        int(os.getenv('USER_STATE_CACHE_MAX_ENTRIES', default=10000)),
+        TIMEOUT=7 * 24 * 60 * 60),
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -148,3 +186,55 @@ STATIC_URL = '/backend_static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+INGREDIENT_AUTOCOMPLETE_LIMIT = int(
+    os.getenv('INGREDIENT_AUTOCOMPLETE_LIMIT', default=50))
+
+INGREDIENT_AUTOCOMPLETE_IN_MEMORY = os.getenv(
+    'INGREDIENT_AUTOCOMPLETE_IN_MEMORY', default='True') == 'True'
+
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=5 * 1024 * 1024))
+
+# JSON-тело рецепта содержит картинку в base64 (на треть больше исходной)
+# и остальные поля, поэтому лимит тела считается от лимита картинки.
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+
+RECIPE_IMAGE_VARIANTS = {
+    'preview': (140, 140),
+    'card': (600, 400),
+    'detail': (1200, 800),
+}
+
+# Веса добавления в избранное и в список покупок в оценках рецептов и
+# период полураспада оценок в днях.
+RECIPE_SCORE_WEIGHTS = {'favorite': 2.0, 'cart': 1.0}
+RECIPE_SCORE_HALF_LIFE_DAYS = {'popular': 90, 'trending': 3}
+RECIPE_TRENDING_WINDOW_DAYS = 14
+
+# Профилирование SQL: 'always' - для всех запросов, 'header' - для
+# запросов с заголовком X-Profile-SQL, пусто - выключено.
+SQL_PROFILING = os.getenv('SQL_PROFILING', default='')
+SQL_PROFILING_TOP = int(os.getenv('SQL_PROFILING_TOP', default=5))
+
+# Метрики Prometheus на /metrics. Под gunicorn процессы пишут их в общий
+# каталог PROMETHEUS_MULTIPROC_DIR, который задаёт gunicorn.conf.py.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='True') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'recipes.profiling': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
@@ -0,0 +1,23 @@
+import os
+import shutil
+
+# Файлы метрик нужны только процессам gunicorn. Переменная задаётся здесь,
+# а не в образе, чтобы management-команды в том же контейнере держали
+# метрики в памяти и не оставляли файлы в общем каталоге.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+
+def on_starting(server):
+    """ Очищает метрики предыдущего запуска. """
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    """ Метрики завершившегося процесса перестают учитываться в
+        показателях livesum (очередь обработки картинок). """
+    # prometheus_client выбирает хранилище значений при импорте, поэтому
+    # он импортируется после установки PROMETHEUS_MULTIPROC_DIR.
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,66 @@
+import threading
+from bisect import bisect_left
+
+from django.db.models import Case, IntegerField, Value, When
+
+from .cache import ingredients_cache
+
+PREFIX_END = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    """ Индекс ингредиентов в памяти процесса: отсортированный массив
+        названий, префиксный поиск по которому делается бинарным
+        поиском. Совпадения по префиксу идут раньше совпадений
+        по подстроке. """
+
+    def __init__(self, ingredients):
+        self.ingredients = sorted(
+            ingredients,
+            key=lambda ingredient: (ingredient['name'].casefold(),
+                                    ingredient['id']))
+        self.keys = [
+            ingredient['name'].casefold() for ingredient in self.ingredients
+        ]
+
+    def search(self, query, limit):
+        query = query.strip().casefold()
+        start = bisect_left(self.keys, query)
+        end = bisect_left(self.keys, query + PREFIX_END, lo=start)
+        results = self.ingredients[start:min(end, start + limit)]
+        if len(results) < limit:
+            for key, ingredient in zip(self.keys, self.ingredients):
+                if query in key and not key.startswith(query):
+                    results.append(ingredient)
+                    if len(results) == limit:
+                        break
+        return results
+
+
+_index_lock = threading.Lock()
+_index_holder = {'version': None, 'index': None}
+
+
+def get_ingredient_index():
+    """ Индекс перестраивается, когда меняется версия ingredients_cache. """
+    version = ingredients_cache.get_version()
+    if _index_holder['version'] == version:
+        return _index_holder['index']
+    with _index_lock:
+        if _index_holder['version'] != version:
+            _index_holder['index'] = IngredientIndex(ingredients_cache.all())
+            _index_holder['version'] = version
+        return _index_holder['index']
+
+
+def search_ingredients(queryset, query, limit):
+    """ Поиск в базе: вхождения подстроки, префиксные совпадения первыми.
+        На PostgreSQL использует индексы по UPPER(name). """
+    query = query.strip()
+    return queryset.filter(name__icontains=query).annotate(
+        match_rank=Case(
+            When(name__istartswith=query, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('match_rank', 'name')[:limit]
@@ -0,0 +1,250 @@
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .counters import count_subquery
+from .models import Favorite, Follow, Ingredient, Recipe, ShopList, Tag
+from .seeding import SEED_PASSWORD
+
+User = get_user_model()
+
+PNG = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywa'
+       'AAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQI'
+       'mWNoAAAAggCByxOyYQAAAABJRU5ErkJggg==')
+
+
+@dataclass
+class Endpoint:
+    """ Запрос к API и бюджет SQL-запросов для него. В path
+        подставляются значения контекста ({recipe}, {tag} и т. д.) и
+        {item} - очередной элемент списка pool. Если задан store, id
+        из ответа добавляется в список контекста с этим именем. """
+    name: str
+    method: str
+    path: str
+    budget: int
+    data: Optional[Callable] = None
+    pool: Optional[str] = None
+    store: Optional[str] = None
+
+
+def recipe_data(context, iteration):
+    return {
+        'name': f'Бенчмарк {iteration}',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': PNG,
+        'tags': context.tag_ids[:2],
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 10}
+            for ingredient_id in context.ingredient_ids[:5]
+        ],
+    }
+
+
+def user_data(context, iteration):
+    return {
+        'email': f'bench-{context.token}-{iteration}@example.com',
+        'username': f'bench-{context.token}-{iteration}',
+        'first_name': 'Имя',
+        'last_name': 'Фамилия',
+        'password': SEED_PASSWORD,
+    }
+
+
+def login_data(context, iteration):
+    return {'email': context.user.email, 'password': context.password}
+
+
+def set_password_data(context, iteration):
+    current, context.password = (
+        context.password, f'{SEED_PASSWORD}-{context.token}-{iteration}')
+    return {'current_password': current, 'new_password': context.password}
+
+
+# Бюджеты - число SQL-запросов, не зависящее от объёма данных и размера
+# страницы. Справочники в первом запросе загружаются в кеш (1 запрос),
+# дальше отдаются без базы. Сводные количества в списках покупок
+# пересчитываются одним UPDATE независимо от числа ингредиентов в рецепте.
+ENDPOINTS = (
+    Endpoint('tags', 'get', '/api/tags/', 1),
+    Endpoint('tag', 'get', '/api/tags/{tag_id}/', 1),
+    Endpoint('ingredients', 'get', '/api/ingredients/', 1),
+    Endpoint('ingredients_search', 'get',
+             '/api/ingredients/?name={ingredient_prefix}', 1),
+    Endpoint('ingredient', 'get', '/api/ingredients/{ingredient_id}/', 1),
+    Endpoint('recipes', 'get', '/api/recipes/?page=2&limit=6', 5),
+    Endpoint('recipes_cursor', 'get', '/api/recipes/?limit=6&cursor=', 4),
+    Endpoint('recipes_by_tags', 'get',
+             '/api/recipes/?limit=6&tags={tag}&tags={other_tag}', 5),
+    Endpoint('recipes_by_author', 'get',
+             '/api/recipes/?limit=6&author={author}', 6),
+    Endpoint('recipes_favorited', 'get',
+             '/api/recipes/?limit=6&is_favorited=1', 5),
+    Endpoint('recipes_in_cart', 'get',
+             '/api/recipes/?limit=6&is_in_shopping_cart=1', 5),
+    Endpoint('recipes_popular', 'get',
+             '/api/recipes/?limit=6&ordering=popular', 5),
+    Endpoint('recipes_search', 'get', '/api/recipes/?limit=6&search=рецепт',
+             5),
+    Endpoint('recipe', 'get', '/api/recipes/{recipe}/', 5),
+    Endpoint('shopping_cart_txt', 'get',
+             '/api/recipes/download_shopping_cart/', 1),
+    Endpoint('shopping_cart_csv', 'get',
+             '/api/recipes/download_shopping_cart/?format=csv', 1),
+    Endpoint('shopping_cart_pdf', 'get',
+             '/api/recipes/download_shopping_cart/?format=pdf', 1),
+    Endpoint('users', 'get', '/api/users/?limit=6', 2),
+    Endpoint('user', 'get', '/api/users/{author}/', 1),
+    Endpoint('users_me', 'get', '/api/users/me/', 1),
+    Endpoint('subscriptions', 'get',
+             '/api/users/subscriptions/?limit=6&recipes_limit=3', 3),
+    Endpoint('recipe_create', 'post', '/api/recipes/', 12, recipe_data,
+             store='created_recipes'),
+    Endpoint('recipe_update', 'patch', '/api/recipes/{item}/', 15,
+             recipe_data, pool='created_recipes'),
+    Endpoint('recipe_delete', 'delete', '/api/recipes/{item}/', 16,
+             pool='created_recipes'),
+    Endpoint('favorite_add', 'post', '/api/recipes/{item}/favorite/', 5,
+             pool='not_favorited'),
+    Endpoint('favorite_delete', 'delete', '/api/recipes/{item}/favorite/', 5,
+             pool='not_favorited'),
+    Endpoint('cart_add', 'post', '/api/recipes/{item}/shopping_cart/', 11,
+             pool='not_in_cart'),
+    Endpoint('cart_delete', 'delete', '/api/recipes/{item}/shopping_cart/',
+             10, pool='not_in_cart'),
+    Endpoint('subscribe', 'post', '/api/users/{item}/subscribe/', 8,
+             pool='not_followed'),
+    Endpoint('unsubscribe', 'delete', '/api/users/{item}/subscribe/', 5,
+             pool='not_followed'),
+    Endpoint('user_create', 'post', '/api/users/', 4, user_data),
+    Endpoint('token_login', 'post', '/api/auth/token/login/', 5, login_data),
+    Endpoint('token_logout', 'post', '/api/auth/token/logout/', 2),
+    Endpoint('set_password', 'post', '/api/users/set_password/', 1,
+             set_password_data),
+)
+
+
+class BenchmarkContext:
+    """ Пользователь, от имени которого идут запросы, значения для
+        подстановки в адреса и списки объектов для изменяющих запросов:
+        по одному объекту на повтор. """
+
+    def __init__(self, user, repeat):
+        self.user = user
+        self.password = SEED_PASSWORD
+        self.token = uuid.uuid4().hex[:8]
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)[:50])
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        ingredient = Ingredient.objects.first()
+        self.values = {
+            'tag_id': self.tag_ids[0],
+            'tag': tags[0],
+            'other_tag': tags[-1],
+            'ingredient_id': ingredient.id,
+            'ingredient_prefix': ingredient.name[:3],
+            'recipe': recipe.id,
+            'author': recipe.author_id,
+        }
+        recipes = Recipe.objects.exclude(author=user).order_by('id')
+        self.pools = {
+            'created_recipes': [],
+            'not_favorited': list(recipes.exclude(
+                favorite_recipe__user=user
+            ).values_list('id', flat=True)[:repeat]),
+            'not_in_cart': list(recipes.exclude(
+                cart_recipe__user=user
+            ).values_list('id', flat=True)[:repeat]),
+            'not_followed': list(User.objects.exclude(pk=user.pk).exclude(
+                pk__in=Follow.objects.filter(user=user).values('following')
+            ).values_list('id', flat=True)[:repeat]),
+        }
+
+    def get_path(self, endpoint, iteration):
+        values = dict(self.values)
+        if endpoint.pool is not None:
+            values['item'] = self.pools[endpoint.pool][iteration]
+        return endpoint.path.format(**values)
+
+
+def get_benchmark_user():
+    """ Пользователь с наибольшим списком покупок, затем избранным и
+        подписками: при случайном заполнении у первого пользователя они
+        могут оказаться пустыми, и запросы мерились бы на пустых данных. """
+    return User.objects.annotate(
+        carts=count_subquery(ShopList, 'user'),
+        favorites=count_subquery(Favorite, 'user'),
+        follows=count_subquery(Follow, 'user'),
+    ).order_by('-carts', '-favorites', '-follows', 'id').first()
+
+
+def percentile(samples, percent):
+    """ Перцентиль с линейной интерполяцией между соседними значениями
+        (statistics.quantiles нет в Python 3.7). """
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (
+        ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_endpoint(context, endpoint, repeat):
+    """ Выполняет запрос repeat раз. Возвращает словарь с максимальным
+        числом SQL-запросов, p50/p95 времени ответа в миллисекундах,
+        средним размером ответа в байтах и кодами ответов. """
+    queries, timings, sizes, statuses = [], [], [], set()
+    request = getattr(context.client, endpoint.method)
+    if endpoint.pool is not None:
+        repeat = min(repeat, len(context.pools[endpoint.pool]))
+    for iteration in range(repeat):
+        path = context.get_path(endpoint, iteration)
+        data = (endpoint.data(context, iteration)
+                if endpoint.data is not None else None)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(path, data, format='json')
+            content = (b''.join(response.streaming_content)
+                       if response.streaming else response.content)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+        sizes.append(len(content))
+        statuses.add(response.status_code)
+        if endpoint.store is not None and response.status_code < 400:
+            context.pools[endpoint.store].append(response.json()['id'])
+    if not timings:
+        return None
+    return {
+        'name': endpoint.name,
+        'method': endpoint.method.upper(),
+        'requests': len(timings),
+        'queries': max(queries),
+        'budget': endpoint.budget,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'size': round(sum(sizes) / len(sizes)),
+        'statuses': sorted(statuses),
+    }
+
+
+def run_benchmark(user, repeat=20, names=None):
+    context = BenchmarkContext(user, repeat)
+    results = []
+    for endpoint in ENDPOINTS:
+        if names and endpoint.name not in names:
+            continue
+        result = run_endpoint(context, endpoint, repeat)
+        if result is not None:
+            results.append(result)
+    return results
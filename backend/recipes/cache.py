@@ -0,0 +1,103 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+from .metrics import record_cache
+from .models import Ingredient, Tag
+
+VERSIONS_CACHE = 'versions'
+USER_STATE_CACHE = 'user_state'
+
+
+class CacheVersion:
+    """ Версия данных в кеше Django, общая для всех процессов gunicorn.
+        Версия - время последнего изменения в наносекундах, поэтому
+        по ней же можно отдавать Last-Modified. Общие версии хранятся
+        бессрочно в отдельном кеше, где их не вытеснят другие записи. """
+
+    def __init__(self, key, alias=VERSIONS_CACHE, timeout=None):
+        self.key = f'version:{key}'
+        self.alias = alias
+        self.timeout = timeout
+
+    def get(self):
+        cache = caches[self.alias]
+        version = cache.get(self.key)
+        if version is not None:
+            return version
+        cache.add(self.key, time.time_ns(), timeout=self.timeout)
+        return cache.get(self.key)
+
+    def bump(self):
+        caches[self.alias].set(self.key, time.time_ns(),
+                               timeout=self.timeout)
+
+    def bump_on_commit(self):
+        transaction.on_commit(self.bump)
+
+
+users_version = CacheVersion('users')
+recipes_version = CacheVersion('recipes')
+recipe_scores_version = CacheVersion('recipe_scores')
+
+
+def get_user_state_version(user):
+    """ Версия избранного, списка покупок и подписок пользователя.
+        Таких версий по одной на пользователя, поэтому они живут в
+        отдельном ограниченном кеше со сроком хранения: потерянная
+        версия создаётся заново и стоит клиенту одного полного ответа. """
+    return CacheVersion(f'user:{user.id}:state', USER_STATE_CACHE,
+                        DEFAULT_TIMEOUT)
+
+
+class ReferenceCache:
+    """ Данные небольшой, редко меняющейся таблицы в памяти процесса.
+
+        Актуальность данных проверяется по версии CacheVersion:
+        изменение таблицы в одном процессе меняет версию, и остальные
+        процессы перечитывают таблицу при следующем обращении. """
+
+    def __init__(self, name, queryset, fields):
+        self.name = name
+        self.version = CacheVersion(f'reference:{name}')
+        self.queryset = queryset
+        self.fields = fields
+        self._lock = threading.Lock()
+        self._state = None
+
+    def get_version(self):
+        return self.version.get()
+
+    def get_state(self):
+        version = self.get_version()
+        state = self._state
+        if state is not None and state['version'] == version:
+            record_cache(self.name, True)
+            return state
+        with self._lock:
+            stale = self._state is None or self._state['version'] != version
+            record_cache(self.name, not stale)
+            if stale:
+                items = list(self.queryset.all().values(*self.fields))
+                self._state = {
+                    'version': version,
+                    'items': items,
+                    'ids': frozenset(item['id'] for item in items),
+                }
+            return self._state
+
+    def all(self):
+        """ Сериализованные объекты таблицы в порядке модели. """
+        return self.get_state()['items']
+
+    def ids(self):
+        return self.get_state()['ids']
+
+
+tags_cache = ReferenceCache(
+    'tags', Tag.objects, ('id', 'name', 'color', 'slug'))
+ingredients_cache = ReferenceCache(
+    'ingredients', Ingredient.objects, ('id', 'name', 'measurement_unit'))
@@ -0,0 +1,120 @@
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import IngredientAmount, Recipe, ShopList, ShopListIngredient
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def lock_recipe(recipe):
+    """ Блокирует строку рецепта до конца транзакции. Добавление рецепта
+        в списки покупок, удаление из них и изменение ингредиентов
+        рецепта берут эту блокировку до чтения IngredientAmount, поэтому
+        списки покупок не пересчитываются по устаревшим количествам. """
+    list(Recipe.objects.select_for_update().filter(
+        pk=recipe.pk).values_list('pk', flat=True))
+
+
+def get_recipe_amounts(recipe):
+    """ Количества ингредиентов рецепта в виде {ingredient_id: amount}. """
+    return dict(IngredientAmount.objects.filter(
+        recipe=recipe).values_list('ingredient_id', 'amount'))
+
+
+def get_amount_deltas(old_amounts, new_amounts):
+    """ Разница между двумя наборами количеств ингредиентов
+        без нулевых значений. """
+    deltas = {
+        ingredient_id: new_amounts.get(ingredient_id, 0) - amount
+        for ingredient_id, amount in old_amounts.items()
+    }
+    for ingredient_id, amount in new_amounts.items():
+        deltas.setdefault(ingredient_id, amount)
+    return {
+        ingredient_id: delta for ingredient_id, delta in deltas.items()
+        if delta
+    }
+
+
+@transaction.atomic
+def apply_cart_deltas(user_ids, deltas):
+    """ Прибавляет deltas ({ingredient_id: delta}) к сводным количествам
+        в списках покупок пользователей user_ids. Все количества меняются
+        одним UPDATE с CASE по ингредиенту, поэтому число запросов не
+        зависит от числа ингредиентов. Строки с нулевым количеством не
+        удаляются: иначе параллельное добавление другого рецепта с тем же
+        ингредиентом могло бы пропустить вставку (строка ещё есть), а
+        затем не найти строку для UPDATE. Нулевые строки не попадают в
+        скачиваемый список и убираются rebuild_cart_totals. """
+    user_ids = list(user_ids)
+    if not user_ids or not deltas:
+        return
+    ShopListIngredient.objects.bulk_create(
+        [
+            ShopListIngredient(user_id=user_id, ingredient_id=ingredient_id)
+            for user_id in user_ids
+            for ingredient_id, delta in deltas.items() if delta > 0
+        ],
+        ignore_conflicts=True,
+    )
+    ShopListIngredient.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    ).update(amount=F('amount') + Case(
+        *[When(ingredient_id=ingredient_id, then=Value(delta))
+          for ingredient_id, delta in deltas.items()],
+        default=Value(0), output_field=IntegerField()))
+
+
+def add_recipe_to_cart(user, recipe):
+    lock_recipe(recipe)
+    apply_cart_deltas([user.id], get_recipe_amounts(recipe))
+
+
+def remove_recipe_from_cart(user, recipe):
+    lock_recipe(recipe)
+    apply_cart_deltas([user.id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe).items()
+    })
+
+
+def update_recipe_in_carts(recipe, old_amounts, new_amounts):
+    """ Переносит изменение ингредиентов рецепта в списки покупок всех
+        пользователей, у которых рецепт лежит в корзине. """
+    deltas = get_amount_deltas(old_amounts, new_amounts)
+    if deltas:
+        apply_cart_deltas(ShopList.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True), deltas)
+
+
+def remove_recipe_from_carts(recipe):
+    lock_recipe(recipe)
+    update_recipe_in_carts(recipe, get_recipe_amounts(recipe), {})
+
+
+@transaction.atomic
+def rebuild_cart_totals(user_ids=None):
+    """ Пересчитывает сводные количества с нуля по таблице ShopList.
+        Без user_ids пересчитываются списки всех пользователей. """
+    totals = ShopListIngredient.objects.all()
+    amounts = IngredientAmount.objects.filter(
+        recipe__cart_recipe__isnull=False)
+    if user_ids is not None:
+        totals = totals.filter(user_id__in=user_ids)
+        amounts = amounts.filter(recipe__cart_recipe__user_id__in=user_ids)
+    totals.delete()
+    rows = amounts.values_list(
+        'recipe__cart_recipe__user_id', 'ingredient_id'
+    ).annotate(amount=Sum('amount')).order_by().iterator()
+    while True:
+        batch = [
+            ShopListIngredient(user_id=user_id, ingredient_id=ingredient_id,
+                               amount=amount)
+            for user_id, ingredient_id, amount in islice(
+                rows, REBUILD_BATCH_SIZE)
+        ]
+        if not batch:
+            break
+        ShopListIngredient.objects.bulk_create(batch)
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import recipes_version
+from .models import Favorite, Follow, Recipe, ShopList
+
+User = get_user_model()
+
+COUNTER_FIELDS = {
+    Favorite: 'favorites_count',
+    ShopList: 'carts_count',
+}
+
+# (модель со счётчиком, поле счётчика, считаемая модель, ссылка на первую)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', ShopList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+)
+
+
+def change_counter(queryset, field, delta, **values):
+    """ Меняет счётчик одним UPDATE с F(), без чтения строки, поэтому
+        параллельные запросы не затирают изменения друг друга. """
+    queryset.update(**{field: F(field) + delta}, **values)
+    bump_version(queryset.model)
+
+
+def bump_version(model):
+    """ Счётчики рецептов входят в списки рецептов. Счётчики
+        пользователей в ответах с валидаторами не отдаются, поэтому
+        кеш при их изменении не сбрасывается. """
+    if model is Recipe:
+        recipes_version.bump_on_commit()
+
+
+def count_subquery(model, field):
+    """ Количество строк model, ссылающихся полем field на внешнюю
+        строку. """
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile_counters():
+    """ Пересчитывает счётчики, разошедшиеся с данными (например, после
+        каскадного удаления пользователя или правок в админке).
+        Возвращает количество исправленных строк по каждому счётчику. """
+    fixed = {}
+    for model, counter, counted_model, field in COUNTERS:
+        actual = count_subquery(counted_model, field)
+        stale = model.objects.annotate(actual=actual).exclude(
+            **{counter: F('actual')}).order_by().values('pk')
+        fixed[f'{model.__name__}.{counter}'] = model.objects.filter(
+            pk__in=stale).update(**{counter: actual})
+        if fixed[f'{model.__name__}.{counter}']:
+            bump_version(model)
+    return fixed
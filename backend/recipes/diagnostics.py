@@ -0,0 +1,88 @@
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import Ingredient, Recipe, Tag
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+POSTGRESQL_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def get_endpoints():
+    """ Основные GET-запросы API с параметрами, которые отправляет
+        фронтенд. Возвращает пары (название, url). """
+    recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+    tag = Tag.objects.order_by('id').first()
+    ingredient = Ingredient.objects.order_by('id').first()
+    endpoints = [
+        ('recipes', '/api/recipes/?page=2&limit=6'),
+        ('recipes_cursor', '/api/recipes/?limit=6&cursor='),
+        ('recipes_favorited', '/api/recipes/?limit=6&is_favorited=1'),
+        ('recipes_in_cart', '/api/recipes/?limit=6&is_in_shopping_cart=1'),
+        ('subscriptions', '/api/users/subscriptions/?limit=6&recipes_limit=3'),
+        ('users', '/api/users/?limit=6'),
+        ('shopping_cart', '/api/recipes/download_shopping_cart/'),
+    ]
+    if recipe is not None:
+        endpoints += [
+            ('recipe', f'/api/recipes/{recipe.id}/'),
+            ('recipes_by_author',
+             f'/api/recipes/?limit=6&author={recipe.author_id}'),
+        ]
+    if tag is not None:
+        endpoints.append(
+            ('recipes_by_tag', f'/api/recipes/?limit=6&tags={tag.slug}'))
+    if ingredient is not None:
+        endpoints.append(
+            ('ingredients', f'/api/ingredients/?name={ingredient.name[:3]}'))
+    return endpoints
+
+
+def get_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def capture_queries(client, url):
+    """ Выполняет GET-запрос и возвращает ответ и список SQL-запросов,
+        включая выполненные при отдаче потокового ответа. """
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return response, [query['sql'] for query in context.captured_queries]
+
+
+def explain(sql):
+    """ План запроса в виде списка строк. """
+    if connection.vendor == 'postgresql':
+        command = 'EXPLAIN'
+    elif connection.vendor == 'sqlite':
+        command = 'EXPLAIN QUERY PLAN'
+    else:
+        raise NotImplementedError(
+            f'EXPLAIN не поддерживается для {connection.vendor}')
+    with connection.cursor() as cursor:
+        cursor.execute(f'{command} {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def find_seq_scans(plan):
+    """ Таблицы, которые план читает полным перебором. Обход индекса
+        целиком (SCAN ... USING INDEX в SQLite) перебором не считается. """
+    tables = set(connection.introspection.table_names())
+    if connection.vendor == 'postgresql':
+        scans = [
+            match.group(1) for line in plan
+            for match in [POSTGRESQL_SEQ_SCAN.search(line)] if match
+        ]
+    else:
+        scans = [
+            match.group(1) for line in plan
+            for match in [SQLITE_SCAN.match(line)]
+            if match and 'USING' not in line
+        ]
+    return sorted({table for table in scans if table in tables})
@@ -0,0 +1,87 @@
+import base64
+import binascii
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import (TemporaryUploadedFile,
+                                            UploadedFile)
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+from rest_framework import serializers
+
+BASE64_MARKER = ';base64,'
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """ Картинка в виде base64-строки (можно data URL) или файла из
+        multipart-запроса. Размер проверяется по длине строки ещё до
+        декодирования, а сама строка декодируется частями во временный
+        файл, так что декодированная картинка целиком в памяти
+        не держится. """
+    default_error_messages = {
+        'invalid_base64': 'Картинка должна быть base64-строкой или файлом.',
+        'too_large': 'Картинка больше {max_size}.',
+        'invalid_type': 'Поддерживаются только картинки JPEG, PNG и GIF.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            self.check_size(data.size)
+            return super().to_internal_value(data)
+        if not isinstance(data, str) or not data:
+            self.fail('invalid_base64')
+        start = data.find(BASE64_MARKER)
+        start = 0 if start == -1 else start + len(BASE64_MARKER)
+        self.check_size((len(data) - start) * 3 // 4)
+        upload = self.decode(data, start)
+        try:
+            return super().to_internal_value(upload)
+        except serializers.ValidationError:
+            upload.close()
+            raise
+
+    def check_size(self, size):
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if size > max_size:
+            self.fail('too_large', max_size=filesizeformat(max_size))
+
+    def decode(self, data, start):
+        """ Декодирует base64 кусками по BASE64_CHUNK_SIZE символов во
+            временный файл. Пробелы и переводы строк пропускаются. """
+        upload = TemporaryUploadedFile('image', None, 0, None)
+        tail = ''
+        try:
+            for position in range(start, len(data), BASE64_CHUNK_SIZE):
+                chunk = tail + ''.join(
+                    data[position:position + BASE64_CHUNK_SIZE].split())
+                usable = len(chunk) - len(chunk) % 4
+                upload.write(base64.b64decode(chunk[:usable], validate=True))
+                tail = chunk[usable:]
+            if tail or not upload.tell():
+                self.fail('invalid_base64')
+        except (binascii.Error, ValueError):
+            upload.close()
+            self.fail('invalid_base64')
+        except serializers.ValidationError:
+            upload.close()
+            raise
+        upload.size = upload.tell()
+        upload.seek(0)
+        image_format = self.get_image_format(upload)
+        if image_format not in IMAGE_EXTENSIONS:
+            upload.close()
+            self.fail('invalid_type')
+        upload.name = f'{uuid.uuid4()}.{IMAGE_EXTENSIONS[image_format]}'
+        upload.content_type = Image.MIME[image_format]
+        return upload
+
+    def get_image_format(self, upload):
+        """ Формат картинки по заголовку файла, без чтения
+            всего изображения. """
+        try:
+            with Image.open(upload.temporary_file_path()) as image:
+                return image.format
+        except (OSError, Image.DecompressionBombError):
+            return None
@@ -1,21 +1,49 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as django_filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.autocomplete import search_ingredients
+from recipes.cache import tags_cache
+from recipes.models import Ingredient, Recipe
+from recipes.ranking import POPULAR, TRENDING
+from recipes.search import search_recipes
+
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+TAGS_MATCH_CHOICES = (
+    (TAGS_MATCH_ANY, 'Любой из тегов'),
+    (TAGS_MATCH_ALL, 'Все теги'),
+)
+ORDERING_CHOICES = (
+    (POPULAR, 'По популярности'),
+    (TRENDING, 'По популярности за последние дни'),
+)
+
+
+def get_tag_choices():
+    return [(tag['slug'], tag['name']) for tag in tags_cache.all()]
 
 
 class IngredientsFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name="name", lookup_expr='istartswith')
+    name = django_filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name', )
 
+    def filter_name(self, queryset, name, value):
+        return search_ingredients(
+            queryset, value, settings.INGREDIENT_AUTOCOMPLETE_LIMIT)
+
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
+    tags = django_filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags',
+    )
+    tags_match = django_filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES,
+        method='filter_tags_match',
     )
     is_favorited = django_filters.BooleanFilter(
         method='get_is_favorited'
@@ -23,10 +51,51 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    ordering = django_filters.ChoiceFilter(
+        choices=ORDERING_CHOICES,
+        method='filter_ordering',
+    )
+    search = django_filters.CharFilter(
+        max_length=200,
+        method='filter_search',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'tags_match', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'ordering', 'search')
+
+    def filter_tags(self, queryset, name, value):
+        """ Отбор по тегам подзапросами EXISTS к таблице связи рецептов
+            с тегами вместо JOIN, поэтому рецепт с несколькими подходящими
+            тегами не дублируется и DISTINCT не нужен. Параметр tags_match
+            задаёт, нужен любой из тегов (any, по умолчанию) или все (all).
+            id тегов берутся из кеша справочников. """
+        slugs = set(value)
+        tag_ids = [tag['id'] for tag in tags_cache.all()
+                   if tag['slug'] in slugs]
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_match') == TAGS_MATCH_ALL:
+            for tag_id in tag_ids:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag_id)))
+            return queryset
+        return queryset.filter(
+            Exists(recipe_tags.filter(tag_id__in=tag_ids)))
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
+
+    def filter_ordering(self, queryset, name, value):
+        """ Сортировка по оценкам из RecipeScore вместо даты. """
+        return queryset.ranked(value)
+
+    def filter_search(self, queryset, name, value):
+        """ Полнотекстовый поиск. Если сортировка ordering не задана,
+            результаты упорядочены по релевантности. """
+        return search_recipes(
+            queryset, value, order=not self.form.cleaned_data.get('ordering'))
 
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import recipes_version
+from .metrics import IMAGE_QUEUE_DEPTH
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = (('jpg', 'JPEG'), ('webp', 'WEBP'))
+VARIANT_QUALITY = 85
+VARIANTS_DIR = 'media/variants'
+ORIGINAL_IMAGE = 'original'
+
+_executor_holder = {}
+_executor_lock = threading.Lock()
+# (id рецепта, путь картинки) в очереди этого процесса: повторная
+# постановка той же картинки пропускается.
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+def get_queue_depth():
+    """ Количество картинок, ожидающих обработки в этом процессе. """
+    return len(_queued)
+
+
+def get_executor():
+    with _executor_lock:
+        if 'executor' not in _executor_holder:
+            _executor_holder['executor'] = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images')
+    return _executor_holder['executor']
+
+
+def make_variants(image, image_name):
+    """ Сохраняет уменьшенные копии картинки во всех форматах и
+        возвращает их пути: {'card': {'jpg': ..., 'webp': ...}, ...}. """
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    base_name = os.path.splitext(os.path.basename(image_name))[0]
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(size, Image.LANCZOS)
+        for extension, image_format in VARIANT_FORMATS:
+            buffer = BytesIO()
+            thumbnail.save(buffer, image_format, quality=VARIANT_QUALITY)
+            variants.setdefault(variant, {})[extension] = default_storage.save(
+                f'{VARIANTS_DIR}/{base_name}_{variant}.{extension}',
+                ContentFile(buffer.getvalue()))
+    return variants
+
+
+def delete_variants(variants):
+    for formats in variants.values():
+        for path in formats.values():
+            default_storage.delete(path)
+
+
+def discard_variants(recipe):
+    """ Удаляет файлы вариантов картинки после фиксации транзакции:
+        при удалении рецепта и при смене его картинки. """
+    variants = recipe.image_variants
+    if variants:
+        transaction.on_commit(lambda: delete_variants(variants))
+
+
+def get_variant_url(recipe, variant, extension):
+    """ Ссылка на вариант картинки рецепта. Пока вариантов нет
+        (картинка ещё в очереди или загружена до появления обработки),
+        отдаётся исходная картинка. Чтение картинки в очередь не ставит:
+        варианты строятся при сохранении картинки, для старых рецептов -
+        командой process_recipe_images. """
+    if variant != ORIGINAL_IMAGE:
+        path = recipe.image_variants.get(variant, {}).get(extension)
+        if path:
+            return default_storage.url(path)
+    return recipe.image.url
+
+
+def process_recipe_image(recipe_id, image_name):
+    """ Строит варианты картинки рецепта и сохраняет их пути в
+        Recipe.image_variants, если картинка за это время не сменилась. """
+    with default_storage.open(image_name) as image_file:
+        with Image.open(image_file) as image:
+            variants = make_variants(image, image_name)
+    recipe = Recipe.objects.filter(pk=recipe_id, image=image_name)
+    old_variants = recipe.values_list('image_variants', flat=True).first()
+    if old_variants is None:
+        delete_variants(variants)
+        return
+    recipe.update(image_variants=variants, updated_at=timezone.now())
+    recipes_version.bump()
+    delete_variants(old_variants)
+
+
+def run_task(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s рецепта %s',
+                         image_name, recipe_id)
+    finally:
+        with _queued_lock:
+            _queued.discard((recipe_id, image_name))
+            IMAGE_QUEUE_DEPTH.set(len(_queued))
+        close_old_connections()
+
+
+def submit(recipe_id, image_name):
+    with _queued_lock:
+        if (recipe_id, image_name) in _queued:
+            return
+        _queued.add((recipe_id, image_name))
+        IMAGE_QUEUE_DEPTH.set(len(_queued))
+    if settings.RECIPE_IMAGE_WORKERS:
+        get_executor().submit(run_task, recipe_id, image_name)
+    else:
+        run_task(recipe_id, image_name)
+
+
+def schedule_image_processing(recipe):
+    """ Ставит картинку рецепта в очередь обработки после фиксации
+        транзакции. Если RECIPE_IMAGE_WORKERS равно 0, картинка
+        обрабатывается сразу в текущем потоке. """
+    if recipe.image:
+        image_name = recipe.image.name
+        transaction.on_commit(lambda: submit(recipe.pk, image_name))
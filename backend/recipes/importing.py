@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from .cache import ingredients_cache
+from .models import Ingredient
+
+IMPORT_BATCH_SIZE = 5000
+JSON_READ_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    """ Элементы JSON-массива верхнего уровня по одному, без загрузки
+        всего файла в память. """
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_READ_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_ingredient_file(path):
+    """ Пары (название, единица измерения) из CSV без заголовка или из
+        JSON-массива объектов с полями name и measurement_unit. Файл
+        читается потоком. """
+    path = Path(path)
+    with path.open(encoding='utf-8') as file:
+        if path.suffix == '.json':
+            for item in iter_json_array(file):
+                yield item['name'], item['measurement_unit']
+        else:
+            for row in csv.reader(file):
+                if row:
+                    yield row[0], row[1] if len(row) > 1 else ''
+
+
+def is_valid_ingredient(name, unit):
+    """ Поля непустые и помещаются в столбцы модели. """
+    opts = Ingredient._meta
+    return (
+        0 < len(name) <= opts.get_field('name').max_length
+        and 0 < len(unit) <= opts.get_field('measurement_unit').max_length
+    )
+
+
+def copy_ingredients(rows, batch_size):
+    """ PostgreSQL: пакеты строк загружаются через COPY во временную
+        таблицу, затем одним INSERT ... ON CONFLICT DO NOTHING переносятся
+        в таблицу ингредиентов. Возвращает (прочитано, добавлено). """
+    table = connection.ops.quote_name(Ingredient._meta.db_table)
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredient_import '
+            '(name text, measurement_unit text) ON COMMIT DROP')
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN WITH (FORMAT csv)', buffer)
+            total += len(batch)
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT DO NOTHING')
+        return total, cursor.rowcount
+
+
+def bulk_create_ingredients(rows, batch_size):
+    """ Остальные базы: пакетный bulk_create с ignore_conflicts.
+        Число добавленных считается по количеству строк до и после. """
+    before = Ingredient.objects.count()
+    total = 0
+    while True:
+        batch = [
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in islice(rows, batch_size)
+        ]
+        if not batch:
+            break
+        Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+    return total, Ingredient.objects.count() - before
+
+
+@transaction.atomic
+def import_ingredients(rows, batch_size=IMPORT_BATCH_SIZE):
+    """ Добавляет ингредиенты из пар (название, единица измерения).
+        Уже существующие (по ограничениям уникальности) и повторяющиеся
+        пропускаются. Возвращает словарь с числом прочитанных,
+        добавленных, пропущенных и некорректных строк. """
+    stats = {'read': 0, 'invalid': 0}
+
+    def valid_rows():
+        for name, unit in rows:
+            stats['read'] += 1
+            name, unit = name.strip(), unit.strip()
+            if is_valid_ingredient(name, unit):
+                yield name, unit
+            else:
+                stats['invalid'] += 1
+
+    if connection.vendor == 'postgresql':
+        total, inserted = copy_ingredients(valid_rows(), batch_size)
+    else:
+        total, inserted = bulk_create_ingredients(valid_rows(), batch_size)
+    if inserted:
+        ingredients_cache.version.bump_on_commit()
+    return dict(stats, inserted=inserted, skipped=total - inserted)
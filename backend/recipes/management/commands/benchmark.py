@@ -0,0 +1,117 @@
+import json
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from recipes.benchmark import ENDPOINTS, get_benchmark_user, run_benchmark
+from recipes.seeding import DEFAULT_INGREDIENTS_FILE, seed_dataset
+
+User = get_user_model()
+
+COLUMNS = (
+    ('name', 'Запрос', 20), ('method', '', 6), ('queries', 'SQL', 4),
+    ('budget', 'Бюджет', 6), ('p50_ms', 'p50, мс', 9),
+    ('p95_ms', 'p95, мс', 9), ('size', 'Размер', 8),
+    ('statuses', 'Коды', 10),
+)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет тестовую базу синтетическими данными, выполняет '
+            'все запросы API и печатает число SQL-запросов, p50/p95 '
+            'времени ответа и размер ответа. Завершается с ошибкой, если '
+            'число SQL-запросов превышает бюджет или запрос вернул '
+            'ошибку. Рабочая база не затрагивается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Среднее число подписок у пользователя')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число рецептов в избранном')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Среднее число рецептов в списке покупок')
+        parser.add_argument('--images', type=int, default=20,
+                            help='Картинок без готовых вариантов '
+                                 'для рецептов')
+        parser.add_argument('--ingredients-file',
+                            default=DEFAULT_INGREDIENTS_FILE)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько раз выполнять каждый запрос')
+        parser.add_argument('--endpoint', action='append', dest='names',
+                            choices=[endpoint.name for endpoint in ENDPOINTS],
+                            help='Выполнить только этот запрос '
+                                 '(можно указать несколько)')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Не удалять тестовую базу после запуска')
+        parser.add_argument('--json', dest='json_path',
+                            help='Сохранить результаты в JSON-файл')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            CACHES={
+                alias: {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': f'benchmark-{alias}',
+                }
+                for alias in settings.CACHES
+            },
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+            MEDIA_ROOT=media_root,
+            RECIPE_IMAGE_WORKERS=0,
+        ):
+            results = self.run_on_test_database(options)
+        self.print_results(results)
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        failures = [
+            result['name'] for result in results
+            if result['queries'] > result['budget']
+            or max(result['statuses']) >= 400
+        ]
+        if failures:
+            raise CommandError(
+                f'Превышен бюджет или ошибка в запросах: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('Все запросы в бюджете.'))
+
+    def run_on_test_database(self, options):
+        """ Создаёт тестовую базу так же, как manage.py test, заполняет
+            её и выполняет запросы. """
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+            keepdb=options['keepdb'])
+        try:
+            if not User.objects.exists():
+                seed_dataset(
+                    users=options['users'], recipes=options['recipes'],
+                    ingredients=options['ingredients'],
+                    follows=options['follows'],
+                    favorites=options['favorites'], carts=options['carts'],
+                    ingredients_file=options['ingredients_file'],
+                    images=options['images'],
+                    seed=options['seed'])
+            user = get_benchmark_user()
+            return run_benchmark(user, options['repeat'], options['names'])
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+
+    def print_results(self, results):
+        self.stdout.write(' '.join(
+            title.ljust(width) for _, title, width in COLUMNS))
+        for result in results:
+            line = ' '.join(
+                str(result[key]).ljust(width) for key, _, width in COLUMNS)
+            over_budget = result['queries'] > result['budget']
+            if over_budget or max(result['statuses']) >= 400:
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
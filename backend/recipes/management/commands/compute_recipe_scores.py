@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ranking import update_recipe_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает оценки рецептов для сортировок popular и '
+            'trending. Запускается периодически, например из cron.')
+
+    def handle(self, *args, **options):
+        count = update_recipe_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f'Оценки пересчитаны для рецептов: {count}'))
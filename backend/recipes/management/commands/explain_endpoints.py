@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from recipes.diagnostics import (capture_queries, explain, find_seq_scans,
+                                 get_client, get_endpoints)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Выполняет основные GET-запросы API, строит EXPLAIN для '
+            'каждого их SQL-запроса и сообщает о последовательном '
+            'чтении таблиц. На маленьких таблицах PostgreSQL выбирает '
+            'перебор и без проблем с индексами, поэтому запускать '
+            'команду стоит на данных production-размера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='id пользователя, от имени которого '
+                                 'выполняются запросы (по умолчанию - '
+                                 'пользователь с наибольшим числом '
+                                 'подписок)')
+        parser.add_argument('--ignore', action='append', default=[],
+                            help='Таблица, перебор которой допустим '
+                                 '(можно указать несколько)')
+        parser.add_argument('--plans', action='store_true',
+                            help='Печатать планы всех запросов')
+        parser.add_argument('--strict', action='store_true',
+                            help='Завершаться с ошибкой, если найден '
+                                 'перебор таблицы')
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                raise CommandError(f'Пользователь {user_id} не найден.')
+            return user
+        user = User.objects.annotate(
+            follows=Count('follower')).order_by('-follows', 'id').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей.')
+        return user
+
+    def handle(self, *args, **options):
+        client = get_client(self.get_user(options['user']))
+        ignored = set(options['ignore'])
+        problems = 0
+        for name, url in get_endpoints():
+            response, queries = capture_queries(client, url)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: {url} - {response.status_code}, '
+                f'запросов: {len(queries)}'))
+            for sql in queries:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = explain(sql)
+                scans = [
+                    table for table in find_seq_scans(plan)
+                    if table not in ignored
+                ]
+                if options['plans'] or scans:
+                    self.stdout.write(f'  {sql}')
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+                if scans:
+                    problems += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'  Перебор таблиц: {", ".join(scans)}'))
+        if not problems:
+            self.stdout.write(self.style.SUCCESS(
+                'Перебора таблиц не найдено.'))
+            return
+        message = f'Запросов с перебором таблиц: {problems}'
+        if options['strict']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
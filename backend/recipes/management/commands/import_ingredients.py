@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.importing import (IMPORT_BATCH_SIZE, import_ingredients,
+                               read_ingredient_file)
+from recipes.seeding import DEFAULT_INGREDIENTS_FILE
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV (название, единица измерения) '
+            'или JSON-массива объектов с полями name и measurement_unit. '
+            'Уже существующие ингредиенты пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_INGREDIENTS_FILE,
+                            help='Файл .csv или .json')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = import_ingredients(read_ingredient_file(options['path']),
+                                   options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Прочитано: {stats["read"]}, добавлено: {stats["inserted"]}, '
+            f'пропущено: {stats["skipped"]}, '
+            f'некорректных: {stats["invalid"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено за {elapsed:.2f} с '
+            f'({stats["read"] / elapsed:.0f} строк/с).'))
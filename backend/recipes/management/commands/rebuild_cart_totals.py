@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cart import rebuild_cart_totals
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает сводные количества ингредиентов в списках '
+            'покупок по таблице ShopList.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='user_ids',
+                            help='id пользователя (можно указать несколько)')
+
+    def handle(self, *args, user_ids=None, **options):
+        rebuild_cart_totals(user_ids)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересчитаны.'))
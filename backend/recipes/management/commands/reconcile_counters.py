@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, списков покупок, рецептов и '
+            'подписчиков с данными и исправляет расхождения.')
+
+    def handle(self, *args, **options):
+        for counter, fixed in reconcile_counters().items():
+            self.stdout.write(f'{counter}: исправлено {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены.'))
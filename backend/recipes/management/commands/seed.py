@@ -0,0 +1,74 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.seeding import (DEFAULT_INGREDIENTS_FILE, SEED_CHUNK_SIZE,
+                             SEED_DAYS, SEED_ZIPF_EXPONENT, seed_dataset)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными с распределением '
+            'популярности по закону Ципфа. Подходит для миллионов строк: '
+            'в PostgreSQL данные пишутся через COPY параллельно из '
+            'нескольких процессов. При одинаковых --seed и --chunk-size '
+            'на пустой базе получаются одинаковые данные.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=None,
+                            help='Сколько ингредиентов взять из файла '
+                                 '(по умолчанию все)')
+        parser.add_argument('--ingredients-file',
+                            default=DEFAULT_INGREDIENTS_FILE)
+        parser.add_argument('--min-recipe-ingredients', type=int, default=3)
+        parser.add_argument('--max-recipe-ingredients', type=int, default=10)
+        parser.add_argument('--follows', type=float, default=10,
+                            help='Среднее число подписок у пользователя')
+        parser.add_argument('--favorites', type=float, default=20,
+                            help='Среднее число рецептов в избранном')
+        parser.add_argument('--carts', type=float, default=5,
+                            help='Среднее число рецептов в списке покупок')
+        parser.add_argument('--images', type=int, default=0,
+                            help='Сколько картинок создать для рецептов')
+        parser.add_argument('--zipf', type=float, default=SEED_ZIPF_EXPONENT,
+                            help='Показатель распределения Ципфа')
+        parser.add_argument('--days', type=int, default=SEED_DAYS,
+                            help='За сколько дней распределить даты')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов (в SQLite всегда 1)')
+        parser.add_argument('--chunk-size', type=int, default=SEED_CHUNK_SIZE,
+                            help='Пользователей или рецептов в одной '
+                                 'транзакции')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        started = time.perf_counter()
+        counts = seed_dataset(
+            users=options['users'], recipes=options['recipes'],
+            ingredients=options['ingredients'],
+            follows=options['follows'], favorites=options['favorites'],
+            carts=options['carts'],
+            recipe_ingredients=(options['min_recipe_ingredients'],
+                                options['max_recipe_ingredients']),
+            ingredients_file=options['ingredients_file'],
+            seed=options['seed'], zipf=options['zipf'], days=options['days'],
+            workers=options['workers'], chunk_size=options['chunk_size'],
+            images=options['images'],
+            progress=self.print_progress)
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        for model, count in counts.items():
+            self.stdout.write(f'{model._meta.db_table}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано строк: {total} за {elapsed:.1f} с '
+            f'({total / elapsed:.0f} строк/с).'))
+
+    def print_progress(self, phase, counts):
+        if self.verbosity > 1:
+            done = ', '.join(
+                f'{model._meta.db_table}: {count}'
+                for model, count in counts.items())
+            self.stdout.write(f'{phase.__name__}: {done}')
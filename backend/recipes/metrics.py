@@ -0,0 +1,128 @@
+import os
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+from .profiling import QueryCounter
+
+UNRESOLVED_VIEW = 'unresolved'
+
+REQUESTS = Counter(
+    'foodgram_http_requests_total', 'Запросы по представлениям',
+    ['view', 'method', 'status'])
+LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds', 'Время ответа',
+    ['view', 'method'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+QUERIES = Histogram(
+    'foodgram_db_queries_per_request', 'SQL-запросов на запрос',
+    ['view'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+DB_DURATION = Histogram(
+    'foodgram_db_duration_seconds', 'Время SQL-запросов на запрос',
+    ['view'], buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+RESPONSE_SIZE = Histogram(
+    'foodgram_http_response_size_bytes', 'Размер ответа',
+    ['view'], buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576,
+                       4194304))
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кешам: справочники в памяти процесса и условные GET',
+    ['cache', 'result'])
+IMAGE_QUEUE_DEPTH = Gauge(
+    'foodgram_image_queue_depth', 'Картинки, ожидающие обработки',
+    multiprocess_mode='livesum')
+
+
+def get_view_name(view_func, method):
+    """ Имя вьюсета и действия, например RecipesViewSet.list. """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', UNRESOLVED_VIEW)
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower())
+    if action is None:
+        return view_class.__name__
+    return f'{view_class.__name__}.{action}'
+
+
+@contextmanager
+def count_queries(counter):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+class MetricsMiddleware:
+    """ Число запросов, время и размер ответа, число и время
+        SQL-запросов по представлениям. Отключается настройкой
+        METRICS_ENABLED. """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with count_queries(queries):
+            response = self.get_response(request)
+        view = getattr(request, 'metrics_view', UNRESOLVED_VIEW)
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        LATENCY.labels(view, request.method).observe(
+            time.perf_counter() - started)
+        if response.streaming:
+            response.streaming_content = self.measure_stream(
+                view, queries, response.streaming_content)
+        else:
+            self.observe(view, queries, len(response.content))
+        return response
+
+    def measure_stream(self, view, queries, chunks):
+        """ Потоковый ответ (списки покупок) читает базу и отдаётся
+            клиенту уже после выхода из middleware, поэтому запросы и
+            размер считаются по мере отдачи. """
+        size = 0
+        try:
+            with count_queries(queries):
+                for chunk in chunks:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.observe(view, queries, size)
+
+    def observe(self, view, queries, size):
+        QUERIES.labels(view).observe(queries.count)
+        DB_DURATION.labels(view).observe(queries.duration)
+        RESPONSE_SIZE.labels(view).observe(size)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_name(view_func, request.method)
+
+
+def get_registry():
+    """ Под gunicorn каждый процесс пишет метрики в файлы каталога
+        PROMETHEUS_MULTIPROC_DIR, и при выдаче они собираются вместе. """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """ Метрики в формате Prometheus. Адрес не проксируется nginx и
+        доступен только внутри сети контейнеров. """
+    return HttpResponse(generate_latest(get_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
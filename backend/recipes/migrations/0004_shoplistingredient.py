@@ -0,0 +1,53 @@
+# Generated by Django 3.2.13 on 2026-10-17 18:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shop_list_ingredients(apps, schema_editor):
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ShopListIngredient = apps.get_model('recipes', 'ShopListIngredient')
+    amounts = IngredientAmount.objects.filter(
+        recipe__cart_recipe__isnull=False
+    ).values_list(
+        'recipe__cart_recipe__user_id', 'ingredient_id'
+    ).annotate(total=models.Sum('amount')).order_by()
+    ShopListIngredient.objects.bulk_create(
+        [
+            ShopListIngredient(user_id=user_id, ingredient_id=ingredient_id,
+                               amount=amount)
+            for user_id, ingredient_id, amount in amounts
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0003_auto_20221108_1951'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopListIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество ингредиента')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shop_list_ingredients', to='recipes.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shop_list_ingredients', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке покупок',
+                'verbose_name_plural': 'Ингредиенты в списках покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoplistingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shop_list_ingredient'),
+        ),
+        migrations.RunPython(fill_shop_list_ingredients,
+                             migrations.RunPython.noop),
+    ]
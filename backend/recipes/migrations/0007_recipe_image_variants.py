@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-17 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, help_text='Пути к уменьшенным копиям картинки по размерам и форматам', verbose_name='Варианты картинки'),
+        ),
+    ]
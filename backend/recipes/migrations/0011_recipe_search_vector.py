@@ -0,0 +1,58 @@
+from django.db import migrations
+
+CREATE_SEARCH = (
+    'ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector '
+    'tsvector',
+    """
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe',
+    'CREATE TRIGGER recipes_recipe_search_vector_trigger '
+    'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+    'FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update()',
+    'UPDATE recipes_recipe SET name = name',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+
+DROP_SEARCH = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """ Колонка search_vector для полнотекстового поиска по названию
+        (вес A) и описанию (вес B) рецепта в русской конфигурации.
+        Колонку заполняет триггер, поэтому в модели её нет и ORM её не
+        читает. На других СУБД миграция ничего не делает. """
+
+    dependencies = [
+        ('recipes', '0010_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgresql(CREATE_SEARCH),
+                             run_on_postgresql(DROP_SEARCH)),
+    ]
@@ -0,0 +1,37 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control)
+from django.utils.http import http_date, quote_etag
+
+from .metrics import record_cache
+
+NANOSECONDS = 10 ** 9
+
+
+class ConditionalGetMixin:
+    """ Условные GET-запросы для вьюсетов. Валидаторы (ETag и
+        Last-Modified) вычисляются до сериализации, и если клиент
+        прислал актуальные If-None-Match или If-Modified-Since,
+        ответ 304 отдаётся без обращения к сериализатору. """
+    cache_control = {'no_cache': True}
+
+    def conditional_response(self, etag_parts, last_modified,
+                             get_response):
+        """ etag_parts - значения, от которых зависит ответ,
+            last_modified - время изменения в секундах или None. """
+        etag = quote_etag(hashlib.md5(
+            '|'.join(map(str, etag_parts)).encode()).hexdigest())
+        if last_modified is not None:
+            last_modified = int(last_modified)
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified)
+        record_cache('conditional_get', response is not None)
+        if response is None:
+            response = get_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, **self.cache_control)
+        return response
@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.core import validators
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value
 
 from user.models import CustomUser
 
@@ -56,6 +57,45 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def ranked(self, score):
+        """ Рецепты по убыванию предвычисленной оценки score (popular
+            или trending) из RecipeScore. Значение оценки доступно как
+            rank. Соединение с RecipeScore внутреннее, чтобы выборка шла
+            по индексу оценки; строка оценки создаётся сигналом post_save
+            при создании рецепта. """
+        return self.filter(score__isnull=False).annotate(
+            rank=F(f'score__{score}')).order_by('-rank', '-id')
+
+    def with_related(self):
+        """ Подгружает автора, тэги и ингредиенты рецептов
+            фиксированным числом запросов. """
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientAmount.objects.select_related('ingredient')
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """ Аннотирует рецепты флагами is_favorited и is_in_shopping_cart
+            для пользователя user. """
+        if user.is_anonymous:
+            false = Value(False, output_field=models.BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShopList.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+
 class Recipe(models.Model):
     tags = models.ManyToManyField(Tag, related_name='recipes',
                                   verbose_name='Ссылка')
@@ -64,6 +104,7 @@ class Recipe(models.Model):
         on_delete=models.CASCADE,
         related_name='recipes',
         verbose_name='Автор рецепта',
+        db_index=False,
     )
     ingredients = models.ManyToManyField(Ingredient,
                                          through='IngredientAmount')
@@ -73,16 +114,31 @@ class Recipe(models.Model):
         upload_to='media/',
         blank=True, null=True,
     )
+    image_variants = models.JSONField(
+        'Варианты картинки', default=dict, blank=True,
+        help_text='Пути к уменьшенным копиям картинки по размерам и форматам')
     text = models.TextField(verbose_name='Описание рецепта')
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления')
-    pub_date = models.DateTimeField('Дата публикации', auto_now_add=True,
-                                    db_index=True)
+    pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -119,9 +175,11 @@ class IngredientAmount(models.Model):
 class Favorite(models.Model):
     """ Модель для Избранного. """
     user = models.ForeignKey(User, on_delete=models.CASCADE,
-                             related_name='user')
+                             related_name='user', db_index=False)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
-                               related_name='favorite_recipe')
+                               related_name='favorite_recipe',
+                               db_index=False)
+    created = models.DateTimeField('Дата добавления', auto_now_add=True)
 
     class Meta:
         verbose_name = 'Избранное'
@@ -130,15 +188,20 @@ class Favorite(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
                 name='unique_user_recipe')]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx'),
+        ]
 
 
 class ShopList(models.Model):
     """ Модель для Листа Покупок. """
 
     user = models.ForeignKey(User, on_delete=models.CASCADE,
-                             related_name='cart_recipe')
+                             related_name='cart_recipe', db_index=False)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
-                               related_name='cart_recipe')
+                               related_name='cart_recipe', db_index=False)
+    created = models.DateTimeField('Дата добавления', auto_now_add=True)
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -147,6 +210,60 @@ class ShopList(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
                 name='unique_customer_recipe')]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='shoplist_recipe_user_idx'),
+        ]
+
+
+class RecipeScore(models.Model):
+    """ Оценки рецепта для сортировок popular и trending: сумма
+        добавлений в избранное и списки покупок с весами и затуханием
+        по давности. Строка с нулевыми оценками создаётся вместе с
+        рецептом, значения пересчитываются командой
+        compute_recipe_scores. """
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE,
+                                  primary_key=True, related_name='score')
+    popular = models.FloatField('Популярность', default=0)
+    trending = models.FloatField('Популярность за последние дни',
+                                 default=0)
+    computed_at = models.DateTimeField('Дата расчёта', null=True)
+
+    class Meta:
+        verbose_name = 'Оценка рецепта'
+        verbose_name_plural = 'Оценки рецептов'
+        indexes = [
+            models.Index(fields=['-popular', '-recipe'],
+                         name='recipe_score_popular_idx'),
+            models.Index(fields=['-trending', '-recipe'],
+                         name='recipe_score_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.popular:.2f} / {self.trending:.2f}'
+
+
+class ShopListIngredient(models.Model):
+    """ Суммарное количество ингредиента в списке покупок пользователя.
+        Поддерживается при изменении списка покупок и ингредиентов
+        рецептов, чтобы скачивание списка не агрегировало рецепты. """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='shop_list_ingredients')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='shop_list_ingredients')
+    amount = models.IntegerField(default=0,
+                                 verbose_name='Количество ингредиента')
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shop_list_ingredient')]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} {self.amount}'
 
 
 class Follow(models.Model):
@@ -154,11 +271,13 @@ class Follow(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE,
                              related_name='follower',
-                             verbose_name='Подписчик',)
+                             verbose_name='Подписчик',
+                             db_index=False,)
     following = models.ForeignKey(settings.AUTH_USER_MODEL,
                                   on_delete=models.CASCADE,
                                   related_name='following',
-                                  verbose_name='Автор',)
+                                  verbose_name='Автор',
+                                  db_index=False,)
 
     class Meta:
         verbose_name = 'Подписка'
@@ -167,6 +286,10 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'following'],
                 name='unique_following')]
+        indexes = [
+            models.Index(fields=['following', 'user'],
+                         name='follow_following_user_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user} подписался на {self.following}'
\ No newline at end of file
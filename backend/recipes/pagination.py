@@ -1,5 +1,202 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
 
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class CustomPageNumberPagination(PageNumberPagination):
+COUNT_EXACT = 'exact'
+COUNT_APPROX = 'approx'
+COUNT_NONE = 'none'
+COUNT_MODES = (COUNT_EXACT, COUNT_APPROX, COUNT_NONE)
+
+
+def estimate_count(queryset):
+    """ Оценка количества строк по плану запроса PostgreSQL. Работает
+        за постоянное время, но может заметно ошибаться; на других
+        базах считается точное количество. """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+class CountMixin:
+    """ Общее количество объектов считается в зависимости от параметра
+        count: exact - COUNT(*), approx - оценка планировщика,
+        none - не считается. """
+    count_query_param = 'count'
+    default_count_mode = COUNT_EXACT
+
+    def get_count_mode(self, request):
+        mode = request.query_params.get(self.count_query_param)
+        return mode if mode in COUNT_MODES else self.default_count_mode
+
+    def get_count(self, queryset, mode):
+        if mode == COUNT_EXACT:
+            return queryset.count()
+        if mode == COUNT_APPROX:
+            return estimate_count(queryset)
+        return None
+
+
+class KeysetPagination(CountMixin, CursorPagination):
+    """ Курсорная пагинация по нескольким полям. В отличие от
+        CursorPagination, позиция - значения всех полей ordering у
+        последней строки, а следующая страница выбирается условием
+        «после позиции», поэтому её стоимость не зависит от глубины.
+        Последним полем должно быть уникальное (id). Порядок можно задать
+        во вьюсете атрибутом keyset_ordering. """
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+    default_count_mode = COUNT_NONE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        queryset = queryset.order_by(*self.ordering)
+        self.count = self.get_count(queryset, self.get_count_mode(request))
+        position = self.decode_position(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = [
+            getattr(last, field.lstrip('-')) for field in self.ordering
+        ]
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_position(position))
+
+    def get_position_filter(self, position):
+        """ Для порядка (a, b, c) и позиции (x, y, z) строит условие
+            a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+            где для убывающих полей > заменяется на <. """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_position(self, position):
+        data = json.dumps(
+            position, default=lambda value: value.isoformat())
+        return urlsafe_b64encode(data.encode()).decode()
+
+    def decode_position(self, request, model):
+        """ Позиция из параметра cursor. Пустой курсор - первая
+            страница. """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(cursor.encode()))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                self.to_python(model, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (BinasciiError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, model, name, value):
+        """ Значение поля модели приводится к его типу, значение
+            аннотации (например, оценки rank) остаётся как есть. """
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+
+class CustomPageNumberPagination(CountMixin, PageNumberPagination):
+    """ Постраничная пагинация с размером страницы в параметре limit.
+        Если в запросе есть параметр cursor (хотя бы пустой), страницы
+        отдаются курсорной пагинацией KeysetPagination. Параметр count
+        задаёт способ подсчёта общего количества; без точного подсчёта
+        наличие следующей страницы определяется по лишней строке. """
     page_size_query_param = 'limit'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        count_mode = self.get_count_mode(request)
+        if count_mode == COUNT_EXACT:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_without_count(queryset, request, count_mode)
+
+    def paginate_without_count(self, queryset, request, count_mode):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.page = None
+        self.request = request
+        try:
+            self.number = int(
+                request.query_params.get(self.page_query_param, 1))
+            if self.number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        self.count = self.get_count(queryset, count_mode)
+        offset = (self.number - 1) * self.page_size
+        page = list(queryset[offset:offset + self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        return page[:self.page_size]
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        if self.page is not None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_lookahead_link(self.has_next, 1)),
+            ('previous', self.get_lookahead_link(self.number > 1, -1)),
+            ('results', data),
+        ]))
+
+    def get_lookahead_link(self, exists, step):
+        if not exists:
+            return None
+        url = self.request.build_absolute_uri()
+        number = self.number + step
+        if number == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, number)
@@ -0,0 +1,146 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ALWAYS = 'always'
+PROFILE_ON_HEADER = 'header'
+PROFILE_HEADER = 'X-Profile-SQL'
+SQL_MAX_LENGTH = 500
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+class QueryCounter:
+    """ Обёртка выполнения запросов (connection.execute_wrapper):
+        считает запросы и их общее время. """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - started)
+
+    def record(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+
+
+class QueryProfile(QueryCounter):
+    """ Кроме числа и времени запросов запоминает самые медленные и
+        повторяющиеся с одинаковым текстом SQL - признак N+1. """
+
+    def __init__(self):
+        super().__init__()
+        self.statements = {}
+
+    def record(self, sql, duration):
+        super().record(sql, duration)
+        count, total, slowest = self.statements.get(sql, (0, 0.0, 0.0))
+        self.statements[sql] = (
+            count + 1, total + duration, max(slowest, duration))
+
+    def slowest(self, limit):
+        return [
+            {'sql': sql[:SQL_MAX_LENGTH], 'ms': milliseconds(slowest)}
+            for sql, (_, _, slowest) in sorted(
+                self.statements.items(), key=lambda item: -item[1][2]
+            )[:limit]
+        ]
+
+    def duplicates(self, limit):
+        return [
+            {'sql': sql[:SQL_MAX_LENGTH], 'count': count,
+             'ms': milliseconds(total)}
+            for sql, (count, total, _) in sorted(
+                self.statements.items(), key=lambda item: -item[1][0]
+            )[:limit]
+            if count > 1
+        ]
+
+
+class SQLProfilingMiddleware:
+    """ Профилирование запросов к API. Режим задаёт SQL_PROFILING:
+        'always' - каждый запрос, 'header' - только запросы с заголовком
+        X-Profile-SQL; при другом значении middleware отключается
+        целиком. Время работы с базой, представления, рендеринга ответа
+        (сериализация в JSON, CSV, PDF) и общее время отдаются в
+        заголовке Server-Timing, подробности с самыми медленными и
+        повторяющимися SQL пишутся в лог recipes.profiling. """
+
+    def __init__(self, get_response):
+        self.mode = settings.SQL_PROFILING
+        if self.mode not in (PROFILE_ALWAYS, PROFILE_ON_HEADER):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.mode == PROFILE_ON_HEADER and not request.headers.get(
+                PROFILE_HEADER):
+            return self.get_response(request)
+        profile = QueryProfile()
+        request.sql_profile_timings = timings = {'started': time.perf_counter()}
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        timings['finished'] = time.perf_counter()
+        self.report(request, response, profile, timings)
+        return response
+
+    def process_template_response(self, request, response):
+        """ Ответы DRF рендерятся после выхода из представления:
+            здесь заканчивается время представления и начинается
+            рендеринг. """
+        timings = getattr(request, 'sql_profile_timings', None)
+        if timings is not None:
+            timings['view'] = time.perf_counter()
+
+            def rendered(response):
+                timings['rendered'] = time.perf_counter()
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, profile, timings):
+        started, finished = timings['started'], timings['finished']
+        view_finished = timings.get('view', finished)
+        durations = {
+            'db': profile.duration,
+            'view': view_finished - started,
+            'render': timings.get('rendered', view_finished) - view_finished,
+            'total': finished - started,
+        }
+        metrics = [
+            f'db;dur={milliseconds(durations["db"])};'
+            f'desc="{profile.count} queries"',
+        ] + [
+            f'{name};dur={milliseconds(durations[name])}'
+            for name in ('view', 'render', 'total')
+        ]
+        response['Server-Timing'] = ', '.join(metrics)
+        limit = settings.SQL_PROFILING_TOP
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'queries': profile.count,
+            **{
+                f'{name}_ms': milliseconds(duration)
+                for name, duration in durations.items()
+            },
+            'slowest': profile.slowest(limit),
+            'duplicates': profile.duplicates(limit),
+        }, ensure_ascii=False))
@@ -0,0 +1,79 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import recipe_scores_version
+from .models import Favorite, Recipe, RecipeScore, ShopList
+
+POPULAR = 'popular'
+TRENDING = 'trending'
+RANKINGS = (POPULAR, TRENDING)
+SCORE_BATCH_SIZE = 1000
+
+
+def get_daily_counts(model):
+    """ Количество добавлений каждого рецепта по дням одним запросом
+        с группировкой: (recipe_id, день, количество). """
+    return model.objects.annotate(day=TruncDate('created')).values(
+        'recipe_id', 'day'
+    ).annotate(total=Count('pk')).values_list(
+        'recipe_id', 'day', 'total').order_by().iterator()
+
+
+def decay(age_days, half_life_days):
+    return 0.5 ** (age_days / half_life_days)
+
+
+def compute_scores(now=None):
+    """ Оценки popular и trending для рецептов, которые хоть раз
+        добавляли в избранное или список покупок. Каждое добавление
+        весит RECIPE_SCORE_WEIGHTS и затухает с периодом полураспада
+        RECIPE_SCORE_HALF_LIFE_DAYS; в trending учитываются только
+        последние RECIPE_TRENDING_WINDOW_DAYS дней. """
+    today = timezone.localdate(now)
+    half_life = settings.RECIPE_SCORE_HALF_LIFE_DAYS
+    window = settings.RECIPE_TRENDING_WINDOW_DAYS
+    scores = defaultdict(lambda: {POPULAR: 0.0, TRENDING: 0.0})
+    for model, weight_key in ((Favorite, 'favorite'), (ShopList, 'cart')):
+        weight = settings.RECIPE_SCORE_WEIGHTS[weight_key]
+        for recipe_id, day, total in get_daily_counts(model):
+            age = max((today - day).days, 0)
+            score = scores[recipe_id]
+            score[POPULAR] += weight * total * decay(age, half_life[POPULAR])
+            if age < window:
+                score[TRENDING] += (
+                    weight * total * decay(age, half_life[TRENDING]))
+    return scores
+
+
+@transaction.atomic
+def update_recipe_scores(now=None):
+    """ Пересчитывает оценки всех рецептов. Строки обновляются на месте
+        пакетами: недостающие добавляются с ignore_conflicts, поэтому
+        пересчёт не конфликтует с рецептами, созданными параллельно.
+        Возвращает количество рецептов. """
+    now = now or timezone.now()
+    scores = compute_scores(now)
+    zero = {POPULAR: 0.0, TRENDING: 0.0}
+    recipe_ids = Recipe.objects.values_list(
+        'id', flat=True).order_by().iterator()
+    updated = 0
+    while True:
+        batch = [
+            RecipeScore(recipe_id=recipe_id, computed_at=now,
+                        **scores.get(recipe_id, zero))
+            for recipe_id in islice(recipe_ids, SCORE_BATCH_SIZE)
+        ]
+        if not batch:
+            break
+        RecipeScore.objects.bulk_create(batch, ignore_conflicts=True)
+        RecipeScore.objects.bulk_update(
+            batch, [*RANKINGS, 'computed_at'])
+        updated += len(batch)
+    recipe_scores_version.bump_on_commit()
+    return updated
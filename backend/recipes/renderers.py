@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+import os
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """ Базовый рендерер списка покупок. Строки списка (название,
+        единица измерения, количество) превращаются в байты методом
+        render_rows по мере чтения из базы, render используется
+        только для ответов с ошибками. """
+    charset = 'utf-8'
+    filename = 'shopping_list'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def render_rows(self, rows):
+        raise NotImplementedError
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render_rows(self, rows):
+        for name, measurement_unit, amount in rows:
+            yield f'{name} ({measurement_unit}) — {amount}\n'.encode(
+                self.charset)
+
+
+class EchoBuffer:
+    """ Псевдобуфер для csv.writer: возвращает записанную строку
+        вместо того, чтобы копить её в памяти. """
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Единица измерения', 'Количество')
+
+    def render_rows(self, rows):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(self.header).encode('utf-8-sig')
+        for row in rows:
+            yield writer.writerow(row).encode(self.charset)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """ PDF собирается постранично в буфер и отдаётся частями:
+        размер документа ограничен числом различных ингредиентов,
+        а не числом рецептов в корзине. """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    title = 'Список покупок'
+    font_name = 'ShoppingListFont'
+    fallback_font_name = 'Helvetica'
+    font_size = 12
+    line_height = 18
+    margin = 50
+    chunk_size = 64 * 1024
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not os.path.exists(font_path):
+            return self.fallback_font_name
+        pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def render_rows(self, rows):
+        buffer = io.BytesIO()
+        font = self.get_font()
+        width, height = A4
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle(self.title)
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(self.margin, height - self.margin, self.title)
+        position = height - self.margin - 2 * self.line_height
+        pdf.setFont(font, self.font_size)
+        for name, measurement_unit, amount in rows:
+            if position < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                position = height - self.margin
+            pdf.drawString(
+                self.margin, position,
+                f'{name} ({measurement_unit}) — {amount}')
+            position -= self.line_height
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(self.chunk_size), b'')
+
+
+SHOPPING_LIST_RENDERERS = (
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    PDFShoppingListRenderer,
+)
@@ -0,0 +1,37 @@
+from django.db import connections
+from django.db.models import (BooleanField, Case, FloatField, Q, Value,
+                              When)
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+TSQUERY = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+
+
+def search_recipes(queryset, query, order=True):
+    """ Полнотекстовый поиск рецептов по названию и описанию. В
+        PostgreSQL условие проверяется по колонке search_vector с
+        GIN-индексом (миграция 0011), релевантность - ts_rank_cd с весом
+        названия выше описания. Строка запроса разбирается
+        websearch_to_tsquery, поэтому поддерживаются кавычки, or и минус.
+        На других СУБД поиск сводится к icontains, а выше ставятся
+        совпадения в названии. Релевантность доступна как search_rank,
+        при order=True по ней же сортируется результат. ts_rank_cd
+        возвращает real, а курсор передаёт позицию как float8: без
+        приведения равные оценки не совпали бы при сравнении, и строки
+        с одинаковой релевантностью пропадали бы между страницами. """
+    if connections[queryset.db].vendor == 'postgresql':
+        vector = f'"{queryset.model._meta.db_table}"."search_vector"'
+        queryset = queryset.filter(RawSQL(
+            f'{vector} @@ {TSQUERY}', (query,), output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank_cd({vector}, {TSQUERY})::float8', (query,),
+            output_field=FloatField()))
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(search_rank=Case(
+            When(name__icontains=query, then=Value(1.0)),
+            default=Value(0.0), output_field=FloatField()))
+    if not order:
+        return queryset
+    return queryset.order_by('-search_rank', '-id')
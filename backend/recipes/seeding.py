@@ -0,0 +1,382 @@
+import io
+import json
+import multiprocessing
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from .cache import (ingredients_cache, recipes_version, tags_cache,
+                    users_version)
+from .cart import rebuild_cart_totals
+from .counters import reconcile_counters
+from .importing import import_ingredients, read_ingredient_file
+from .models import (Favorite, Follow, Ingredient, IngredientAmount, Recipe,
+                     ShopList, Tag)
+from .ranking import update_recipe_scores
+
+User = get_user_model()
+
+SEED_CHUNK_SIZE = 10000
+SEED_ZIPF_EXPONENT = 1.1
+SEED_DAYS = 365
+SEED_PASSWORD = 'seed-password'
+SEED_IMAGE_SIZE = (1200, 800)
+DEFAULT_INGREDIENTS_FILE = (
+    Path(settings.BASE_DIR).parent / 'data' / 'ingredients.csv')
+SEED_TAGS = (
+    ('Завтрак', Tag.BLUE, 'breakfast'),
+    ('Обед', Tag.ORANGE, 'lunch'),
+    ('Ужин', Tag.GREEN, 'dinner'),
+    ('Десерт', Tag.PURPLE, 'dessert'),
+    ('Перекус', Tag.YELLOW, 'snack'),
+)
+SEED_DISHES = ('Салат', 'Суп', 'Запеканка', 'Пирог', 'Рагу', 'Паста',
+               'Омлет', 'Каша', 'Десерт', 'Соус')
+# Простое число больше любого реального числа строк: умножение на него по
+# модулю size переставляет индексы, чтобы популярность рецепта не
+# зависела от его id.
+SCATTER_PRIME = 2654435761
+
+
+def read_ingredients(path, count=None):
+    """ Первые count ингредиентов из CSV или JSON (название, единица
+        измерения), без count - все. Если файла нет, названия
+        генерируются. """
+    if Path(path).exists():
+        return list(islice(read_ingredient_file(path), count))
+    return [(f'ингредиент {number}', 'г') for number in range(count or 0)]
+
+
+def zipf_index(rng, size, exponent):
+    """ Индекс от 0 до size - 1, выбранный по закону Ципфа: вероятность
+        ранга r пропорциональна r ** -exponent. Используется обратная
+        функция непрерывного приближения, поэтому таблицы весов в памяти
+        не нужны даже для миллионов элементов. """
+    if exponent == 1:
+        rank = size ** rng.random()
+    else:
+        power = 1 - exponent
+        rank = ((size ** power - 1) * rng.random() + 1) ** (1 / power)
+    return min(int(rank), size) - 1
+
+
+def zipf_sample(rng, size, count, exponent):
+    """ count различных индексов по закону Ципфа в порядке возрастания.
+        Если нужна заметная доля всех элементов, выбор равномерный:
+        добирать редкие индексы из хвоста распределения слишком долго. """
+    count = min(count, size)
+    if count * 4 > size:
+        return sorted(rng.sample(range(size), count))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.add(zipf_index(rng, size, exponent))
+    return sorted(chosen)
+
+
+def scatter(index, size):
+    return index * SCATTER_PRIME % size
+
+
+def activity(rng, mean, limit):
+    """ Число действий пользователя: экспоненциальное распределение
+        со средним mean, большинство делает мало, единицы - очень много. """
+    if mean <= 0:
+        return 0
+    return min(int(rng.expovariate(1 / mean)), limit)
+
+
+def copy_value(value):
+    """ Значение в текстовом формате COPY. """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        value = json.dumps(value, ensure_ascii=False)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+def insert_rows(model, fields, rows):
+    """ Вставляет строки (кортежи значений fields) в таблицу модели в
+        обход ORM: в PostgreSQL через COPY FROM STDIN, в остальных базах
+        через executemany. Значения, включая id и даты, пишутся как есть,
+        auto_now_add их не перезаписывает. Возвращает число строк. """
+    if not rows:
+        return 0
+    opts = model._meta
+    model_fields = [opts.get_field(name) for name in fields]
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    columns = ', '.join(quote(field.column) for field in model_fields)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(map(copy_value, row)))
+                buffer.write('\n')
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN', buffer)
+        else:
+            placeholders = ', '.join(['%s'] * len(fields))
+            cursor.executemany(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                [[field.get_db_prep_save(value, connection)
+                  for field, value in zip(model_fields, row)]
+                 for row in rows])
+    return len(rows)
+
+
+def reset_sequences(*models):
+    """ Сдвигает последовательности id после вставки с явными id. """
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+@dataclass
+class SeedPlan:
+    """ Параметры генерации. Передаётся в рабочие процессы; по нему
+        любой процесс независимо вычисляет id, даты и случайные значения
+        своей части данных. """
+    seed: int
+    users: int
+    recipes: int
+    follows: int
+    favorites: int
+    carts: int
+    recipe_ingredients: tuple
+    zipf: float
+    chunk_size: int
+    first_user_id: int
+    first_recipe_id: int
+    tag_ids: list
+    ingredients: list
+    images: list
+    password: str
+    start: datetime
+    end: datetime
+
+    def get_rng(self, phase, chunk_start):
+        return random.Random(f'{self.seed}:{phase}:{chunk_start}')
+
+    def moment(self, share):
+        return self.start + (self.end - self.start) * share
+
+    def user_id(self, index):
+        return self.first_user_id + index
+
+    def recipe_id(self, index):
+        return self.first_recipe_id + index
+
+    def pub_date(self, index):
+        """ Рецепты публикуются равномерно, в порядке id. """
+        return self.moment((index + 0.5) / self.recipes)
+
+
+def seed_users(plan, chunk_start):
+    chunk = range(chunk_start, min(chunk_start + plan.chunk_size, plan.users))
+    rows = []
+    for index in chunk:
+        user_id = plan.user_id(index)
+        rows.append((
+            user_id, plan.password, False, False, True,
+            plan.moment(index / plan.users), f'user{user_id}@example.com',
+            f'user{user_id}', 'Имя', 'Фамилия', 0, 0,
+        ))
+    return {User: insert_rows(User, (
+        'id', 'password', 'is_superuser', 'is_staff', 'is_active',
+        'date_joined', 'email', 'username', 'first_name', 'last_name',
+        'recipes_count', 'followers_count'), rows)}
+
+
+def seed_recipes(plan, chunk_start):
+    """ Рецепты с ингредиентами и тегами. Автор выбирается по закону
+        Ципфа: немногие пользователи пишут большую часть рецептов. """
+    rng = plan.get_rng('recipes', chunk_start)
+    chunk = range(chunk_start,
+                  min(chunk_start + plan.chunk_size, plan.recipes))
+    ingredients_count = len(plan.ingredients)
+    recipes, amounts, tags = [], [], []
+    for index in chunk:
+        recipe_id = plan.recipe_id(index)
+        ingredient_indexes = [
+            scatter(ingredient_index, ingredients_count)
+            for ingredient_index in zipf_sample(
+                rng, ingredients_count, rng.randint(*plan.recipe_ingredients),
+                plan.zipf)
+        ]
+        main_ingredient = plan.ingredients[ingredient_indexes[0]][1]
+        name = f'{rng.choice(SEED_DISHES)}: {main_ingredient}'[:100]
+        pub_date = plan.pub_date(index)
+        image = rng.choice(plan.images) if plan.images else None
+        recipes.append((
+            recipe_id, plan.user_id(zipf_index(rng, plan.users, plan.zipf)),
+            name, image, {}, f'Простой рецепт, главное - {main_ingredient}.',
+            rng.randint(5, 180), pub_date, pub_date, 0, 0,
+        ))
+        amounts.extend(
+            (recipe_id, plan.ingredients[ingredient_index][0],
+             rng.randint(1, 500))
+            for ingredient_index in ingredient_indexes)
+        tags.extend(
+            (recipe_id, tag_id)
+            for tag_id in rng.sample(plan.tag_ids, rng.randint(1, 2)))
+    return {
+        Recipe: insert_rows(Recipe, (
+            'id', 'author', 'name', 'image', 'image_variants', 'text',
+            'cooking_time', 'pub_date', 'updated_at', 'favorites_count',
+            'carts_count'), recipes),
+        IngredientAmount: insert_rows(
+            IngredientAmount, ('recipe', 'ingredient', 'amount'), amounts),
+        Recipe.tags.through: insert_rows(
+            Recipe.tags.through, ('recipe', 'tag'), tags),
+    }
+
+
+def seed_relations(plan, chunk_start):
+    """ Подписки, избранное и списки покупок пользователей. Цели
+        выбираются по закону Ципфа: на популярных авторов подписываются
+        чаще, популярные рецепты чаще добавляют. Рецепт добавляется
+        в случайный момент после публикации. """
+    rng = plan.get_rng('relations', chunk_start)
+    chunk = range(chunk_start, min(chunk_start + plan.chunk_size, plan.users))
+    follows = []
+    lists = {Favorite: [], ShopList: []}
+    per_user = {Favorite: plan.favorites, ShopList: plan.carts}
+    for index in chunk:
+        user_id = plan.user_id(index)
+        follows.extend(
+            (user_id, plan.user_id(following))
+            for following in zipf_sample(
+                rng, plan.users,
+                activity(rng, plan.follows, plan.users // 2), plan.zipf)
+            if following != index)
+        for model, rows in lists.items():
+            for rank in zipf_sample(
+                    rng, plan.recipes,
+                    activity(rng, per_user[model], plan.recipes // 2),
+                    plan.zipf):
+                recipe_index = scatter(rank, plan.recipes)
+                published = plan.pub_date(recipe_index)
+                rows.append((
+                    user_id, plan.recipe_id(recipe_index),
+                    published + (plan.end - published) * rng.random()))
+    result = {Follow: insert_rows(Follow, ('user', 'following'), follows)}
+    for model, rows in lists.items():
+        result[model] = insert_rows(model, ('user', 'recipe', 'created'), rows)
+    return result
+
+
+def run_chunk(task):
+    phase, plan, chunk_start = task
+    with transaction.atomic():
+        return phase(plan, chunk_start)
+
+
+def run_phase(phase, plan, total, workers, progress=None):
+    """ Выполняет фазу генерации частями по chunk_size. Части не зависят
+        друг от друга, поэтому при workers > 1 они пишутся параллельно
+        из отдельных процессов, каждый со своим соединением с базой. """
+    tasks = [(phase, plan, chunk_start)
+             for chunk_start in range(0, total, plan.chunk_size)]
+    if workers > 1:
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(workers) as pool:
+            results = list(pool.imap_unordered(run_chunk, tasks))
+    else:
+        results = map(run_chunk, tasks)
+    counts = {}
+    for result in results:
+        for model, count in result.items():
+            counts[model] = counts.get(model, 0) + count
+        if progress is not None:
+            progress(phase, counts)
+    return counts
+
+
+def save_seed_images(count, seed):
+    """ count однотонных картинок в хранилище медиафайлов. Вариантов
+        у них нет, как у картинок, ещё не прошедших обработку. """
+    rng = random.Random(f'{seed}:images')
+    names = []
+    for number in range(count):
+        buffer = io.BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', SEED_IMAGE_SIZE, color).save(buffer, 'JPEG')
+        names.append(default_storage.save(
+            f'media/seed-{seed}-{number}.jpg', ContentFile(buffer.getvalue())))
+    return names
+
+
+def seed_dataset(users=50, recipes=500, ingredients=500, follows=10,
+                 favorites=20, carts=5, recipe_ingredients=(3, 10),
+                 ingredients_file=DEFAULT_INGREDIENTS_FILE, seed=0,
+                 zipf=SEED_ZIPF_EXPONENT, days=SEED_DAYS, workers=1,
+                 chunk_size=SEED_CHUNK_SIZE, images=0, progress=None):
+    """ Заполняет базу синтетическими данными: пользователи (пароль
+        SEED_PASSWORD), теги, ингредиенты, рецепты с ингредиентами и
+        тегами, подписки, избранное и списки покупок. follows, favorites
+        и carts - среднее число на пользователя; рецептам достаются
+        картинки из images общих файлов. Данные добавляются к
+        существующим; при одинаковых seed и chunk_size на пустой базе
+        получается один и тот же набор при любом числе процессов.
+        Сводные таблицы (списки покупок, счётчики, оценки)
+        пересчитываются. Возвращает число строк по моделям. """
+    if connection.vendor == 'sqlite':
+        # SQLite не допускает параллельной записи.
+        workers = 1
+    Tag.objects.bulk_create(
+        [Tag(name=name, color=color, slug=slug)
+         for name, color, slug in SEED_TAGS],
+        ignore_conflicts=True)
+    import_ingredients(read_ingredients(ingredients_file, ingredients))
+    end = timezone.now()
+    plan = SeedPlan(
+        seed=seed, users=users, recipes=recipes, follows=follows,
+        favorites=favorites, carts=carts,
+        recipe_ingredients=recipe_ingredients, zipf=zipf,
+        chunk_size=chunk_size,
+        first_user_id=(User.objects.aggregate(Max('id'))['id__max'] or 0) + 1,
+        first_recipe_id=(
+            Recipe.objects.aggregate(Max('id'))['id__max'] or 0) + 1,
+        tag_ids=list(Tag.objects.values_list('id', flat=True)),
+        ingredients=list(Ingredient.objects.order_by('id').values_list(
+            'id', 'name')),
+        images=save_seed_images(images, seed),
+        password=make_password(SEED_PASSWORD),
+        start=end - timedelta(days=days), end=end,
+    )
+    counts = run_phase(seed_users, plan, users, workers, progress)
+    if recipes:
+        counts.update(run_phase(seed_recipes, plan, recipes, workers,
+                                progress))
+        counts.update(run_phase(seed_relations, plan, users, workers,
+                                progress))
+    reset_sequences(User, Recipe)
+
+    rebuild_cart_totals()
+    reconcile_counters()
+    update_recipe_scores()
+    tags_cache.version.bump_on_commit()
+    ingredients_cache.version.bump_on_commit()
+    recipes_version.bump_on_commit()
+    users_version.bump_on_commit()
+    return counts
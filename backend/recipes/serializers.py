@@ -1,9 +1,16 @@
-from drf_extra_fields.fields import Base64ImageField
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
-from rest_framework.generics import get_object_or_404
 
 from user.models import CustomUser
 from user.serializers import CustomUserSerializer
+from recipes.cache import ingredients_cache, tags_cache
+from recipes.cart import lock_recipe, update_recipe_in_carts
+from recipes.counters import change_counter
+from recipes.fields import StreamingBase64ImageField
+from recipes.images import (ORIGINAL_IMAGE, VARIANT_FORMATS, discard_variants,
+                            get_variant_url, schedule_image_processing)
 from recipes.models import (Favorite, Follow, Ingredient, IngredientAmount, Recipe,
                             ShopList, Tag)
 
@@ -47,23 +54,41 @@ class RecipesSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients',
-            'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'is_favorited', 'is_in_shopping_cart', 'favorites_count',
+            'name', 'image', 'image_variants', 'text', 'cooking_time'
         )
 
+    def get_image_variants(self, obj):
+        """ Ссылки на уменьшенные копии картинки. Пока картинка
+            обрабатывается, словарь пустой. """
+        request = self.context.get('request')
+        return {
+            variant: {
+                extension: request.build_absolute_uri(
+                    default_storage.url(path))
+                for extension, path in formats.items()
+            }
+            for variant, formats in obj.image_variants.items()
+        }
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         if self.context['request'].user.is_authenticated:
             current_user = self.context['request'].user
             return Favorite.objects.filter(user=current_user,
                                            recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         if self.context['request'].user.is_authenticated:
             current_user = self.context['request'].user
             return ShopList.objects.filter(user=current_user,
@@ -89,11 +114,8 @@ class RecipesCreateSerializer(serializers.ModelSerializer):
         с методами создания и обновления. """
     author = CustomUserSerializer(read_only=True)
     ingredients = CreateIngredientRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-    )
-    image = Base64ImageField()
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -102,85 +124,159 @@ class RecipesCreateSerializer(serializers.ModelSerializer):
             'name', 'image', 'text', 'cooking_time'
         )
 
+    def validate_tags(self, tags):
+        missing = set(tags) - tags_cache.ids()
+        if missing:
+            raise serializers.ValidationError(
+                f'Тэги не найдены: {sorted(missing)}')
+        return tags
+
     def validate(self, data):
-        ingredients = data['ingredients']
-        ingredient_list = []
-        for items in ingredients:
-            ingredient = get_object_or_404(
-                IngredientAmount, id=items['id'])
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    'Ингредиенты должны быть уникальными!')
-            ingredient_list.append(ingredient)
-        tags = data['tags']
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise serializers.ValidationError(
-                    'Тэги должны быть уникальными!'
-                )
-            tags_list.append(tag)
+        ingredient_ids = [item['id'] for item in data.get('ingredients', [])]
+        unique_ingredient_ids = set(ingredient_ids)
+        if len(unique_ingredient_ids) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиенты должны быть уникальными!')
+        missing = unique_ingredient_ids - ingredients_cache.ids()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}')
+        tags = data.get('tags', [])
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError(
+                'Тэги должны быть уникальными!'
+            )
         return data
 
     def create_ingredients(self, ingredients, recipe):
-        create_ingredient = [
+        if not ingredients:
+            return
+        IngredientAmount.objects.bulk_create([
             IngredientAmount(
                 recipe=recipe,
-                ingredient=Ingredient.objects.get(pk=ingredient["id"]),
+                ingredient_id=ingredient['id'],
                 amount=ingredient['amount']
             )
-            for ingredient in ingredients]
-        IngredientAmount.objects.bulk_create(create_ingredient)
+            for ingredient in ingredients])
 
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request')
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(author=request.user, **validated_data)
+        change_counter(CustomUser.objects.filter(pk=request.user.pk),
+                       'recipes_count', 1)
         recipe.tags.add(*tags)
         self.create_ingredients(ingredients, recipe)
+        schedule_image_processing(recipe)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """ Приводит ингредиенты рецепта к списку ingredients, изменяя
+            только отличающиеся строки IngredientAmount. """
+        lock_recipe(recipe)
+        current = {
+            row.ingredient_id: row
+            for row in recipe.ingredients_in_recipe.all()
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in current.items()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount'] for ingredient in ingredients
+        }
+        to_update = []
+        for ingredient_id, amount in new_amounts.items():
+            row = current.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                to_update.append(row)
+        to_delete = [
+            row.id for ingredient_id, row in current.items()
+            if ingredient_id not in new_amounts
+        ]
+        if to_delete:
+            IngredientAmount.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            IngredientAmount.objects.bulk_update(to_update, ['amount'])
+        self.create_ingredients(
+            [
+                ingredient for ingredient in ingredients
+                if ingredient['id'] not in current
+            ],
+            recipe)
+        update_recipe_in_carts(recipe, old_amounts, new_amounts)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+            self.update_ingredients(
+                instance, validated_data.pop('ingredients'))
         if 'tags' in validated_data:
             instance.tags.set(validated_data.pop('tags'))
-        return super().update(instance, validated_data)
+        if 'image' in validated_data:
+            discard_variants(instance)
+            instance.image_variants = {}
+        recipe = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            schedule_image_processing(recipe)
+        return recipe
+
+    def save(self, **kwargs):
+        """ После сохранения закрывает временный файл картинки,
+            не дожидаясь сборщика мусора. """
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_flags(
+            request.user).get(pk=instance.pk)
         return RecipesSerializer(
             instance,
             context={
-                'request': self.context.get('request')
+                'request': request
             }).data
 
 
 class RecipeFollowSerializer(RecipesSerializer):
     """ Сериализатор модели Рецепты для отображения
-        в подписках. """
+        в подписках. Вместо оригинала картинки отдаёт уменьшенную
+        копию: размер выбирается параметром image_size (preview, card,
+        detail или original), формат - image_format (jpg или webp). """
+    image = serializers.SerializerMethodField()
+
+    default_image_size = 'preview'
+    default_image_format = 'jpg'
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
-
-class UserFollowSerializer(CustomUserSerializer):
-    """ Сериализатор модели Пользователя, для отображения
-        в подписках. """
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
-
-    class Meta:
-        fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count')
-        model = CustomUser
-
-    def to_representation(self, instance):
-        authors = FollowSerializer(instance.following, context={'request': self.context.get('request')})
-        return authors.data
+    def get_image_options(self):
+        request = self.context.get('request')
+        params = request.query_params if request is not None else {}
+        size = params.get('image_size')
+        if size != ORIGINAL_IMAGE and size not in settings.RECIPE_IMAGE_VARIANTS:
+            size = self.default_image_size
+        image_format = params.get('image_format')
+        if image_format not in dict(VARIANT_FORMATS):
+            image_format = self.default_image_format
+        return size, image_format
+
+    def get_image(self, obj):
+        if not obj.image:
+            return None
+        url = get_variant_url(obj, *self.get_image_options())
+        request = self.context.get('request')
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -188,7 +284,6 @@ class FollowSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
@@ -203,17 +298,16 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_recipes(self, data):
         request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        recipes = (data.recipes.all()[:int(limit)] if limit else
-                   data.recipes.all())
+        recipes = getattr(data, 'recipe_previews', None)
+        if recipes is None:
+            limit = request.query_params.get('recipes_limit')
+            recipes = (data.recipes.all()[:int(limit)] if limit else
+                       data.recipes.all())
         context = {'request': request}
         return RecipeFollowSerializer(
             recipes, many=True, context=context
         ).data
 
-    def get_recipes_count(self, data):
-        return data.recipes.count()
-
 
 class FollowCreateSerializer(serializers.ModelSerializer):
     """ Сериализатор создания объекта Подписки. """
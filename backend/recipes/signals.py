@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import (ingredients_cache, recipes_version, tags_cache,
+                    users_version)
+from .images import discard_variants
+from .models import Ingredient, Recipe, RecipeScore, Tag, User
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(**kwargs):
+    tags_cache.version.bump_on_commit()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(**kwargs):
+    ingredients_cache.version.bump_on_commit()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(created=False, update_fields=None, **kwargs):
+    """ Новый пользователь ещё не автор рецептов, а вход меняет только
+        last_login: в обоих случаях данные авторов прежние. """
+    if created or (update_fields is not None
+                   and set(update_fields) == {'last_login'}):
+        return
+    users_version.bump_on_commit()
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(**kwargs):
+    recipes_version.bump_on_commit()
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_score(instance, created, raw=False, **kwargs):
+    """ Строка оценки нужна каждому рецепту, откуда бы он ни появился
+        (API, админка, импорт, shell): без неё рецепт выпадает из
+        сортировок по оценкам. """
+    if created and not raw:
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe_id=instance.pk)], ignore_conflicts=True)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_variants(instance, **kwargs):
+    discard_variants(instance)
@@ -0,0 +1,43 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from user.models import CustomUser
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Полнотекстовый поиск работает только в PostgreSQL')
+class SearchKeysetPaginationTest(TestCase):
+    """ Курсорная пагинация результатов поиска отдаёт те же рецепты, что
+        и постраничная, в том числе при одинаковой релевантности. """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='pw123456!')
+        for number in range(3):
+            Recipe.objects.create(
+                author=author, name=f'Холодный суп {number}', text='Горячий',
+                cooking_time=10)
+        for number in range(7):
+            Recipe.objects.create(
+                author=author, name=f'Блюдо {number}', text='Похоже на суп',
+                cooking_time=10)
+
+    def get_ids(self, **params):
+        client = APIClient()
+        data = client.get('/api/recipes/', {'search': 'суп', **params}).json()
+        ids = [recipe['id'] for recipe in data['results']]
+        while data['next']:
+            data = client.get(data['next']).json()
+            ids += [recipe['id'] for recipe in data['results']]
+        return ids
+
+    def test_tied_ranks_are_not_skipped(self):
+        expected = self.get_ids(limit=100)
+        self.assertEqual(len(expected), 10)
+        self.assertEqual(self.get_ids(limit=2, cursor=''), expected)
@@ -1,9 +1,16 @@
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.status import HTTP_204_NO_CONTENT
 
-from .models import Recipe
+from .cache import get_user_state_version
+from .cart import add_recipe_to_cart, remove_recipe_from_cart
+from .counters import COUNTER_FIELDS, change_counter
+from .models import Recipe, ShopList
 from .serializers import RecipeFollowSerializer
 
 
@@ -12,7 +19,13 @@ def adding_obj_view(model, user, pk):
     if model.objects.filter(user=user, recipe=recipe).exists():
         return Response('Рецепт добавлен в список',
                         status=status.HTTP_400_BAD_REQUEST)
-    add_cart = model.objects.create(user=user, recipe=recipe)
+    with transaction.atomic():
+        add_cart = model.objects.create(user=user, recipe=recipe)
+        if model is ShopList:
+            add_recipe_to_cart(user, recipe)
+        change_counter(Recipe.objects.filter(pk=recipe.pk),
+                       COUNTER_FIELDS[model], 1, updated_at=timezone.now())
+        get_user_state_version(user).bump_on_commit()
     serializer = RecipeFollowSerializer(add_cart.recipe)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -23,5 +36,49 @@ def delete_obj_view(model, user, pk):
         return Response('Рецепт отсутствует',
                         status=status.HTTP_400_BAD_REQUEST)
     obj = model.objects.filter(user=user, recipe__id=pk)
-    obj.delete()
+    with transaction.atomic():
+        deleted, _ = obj.delete()
+        if model is ShopList:
+            remove_recipe_from_cart(user, recipe)
+        change_counter(Recipe.objects.filter(pk=recipe.pk),
+                       COUNTER_FIELDS[model], -deleted,
+                       updated_at=timezone.now())
+        get_user_state_version(user).bump_on_commit()
     return Response(status=HTTP_204_NO_CONTENT)
+
+
+def attach_recipe_previews(authors, limit=None):
+    """ Выбирает одним запросом не более limit последних рецептов каждого
+        автора и сохраняет их в атрибут recipe_previews. Отбор первых
+        limit строк делается оконной функцией ROW_NUMBER() по автору. """
+    previews = {author.id: [] for author in authors}
+    if not previews:
+        return
+    recipes = Recipe.objects.filter(author_id__in=previews).only(
+        'id', 'name', 'image', 'image_variants', 'cooking_time',
+        'author_id', 'pub_date')
+    if limit is not None:
+        ranked = recipes.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        ))
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            f'ORDER BY author_id, row_number',
+            (*params, limit),
+        )
+    for recipe in recipes:
+        previews[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recipe_previews = previews[author.id]
+
+
+def get_recipes_limit(request):
+    """ Значение параметра recipes_limit или None, если он не задан
+        или не является неотрицательным целым числом. """
+    limit = request.query_params.get('recipes_limit')
+    if limit is None or not limit.isdigit():
+        return None
+    return int(limit)
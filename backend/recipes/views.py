@@ -1,5 +1,8 @@
-from django.db.models import Sum
-from django.http.response import HttpResponse
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.http.response import StreamingHttpResponse
 from djoser.views import UserViewSet
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
@@ -9,16 +12,26 @@ from rest_framework.permissions import (IsAuthenticated,
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 
+from recipes.autocomplete import get_ingredient_index
+from recipes.cache import (get_user_state_version, ingredients_cache,
+                           recipe_scores_version, recipes_version,
+                           tags_cache, users_version)
 from recipes.filters import IngredientsFilter, RecipeFilter
+from recipes.ranking import RANKINGS
 from user.serializers import CustomUserSerializer
 from user.models import CustomUser
-from .models import (Favorite, Follow, Ingredient, IngredientAmount, Recipe,
-                     ShopList, Tag)
+from .cart import remove_recipe_from_carts
+from .counters import change_counter
+from .models import (Favorite, Follow, Ingredient, Recipe, ShopList,
+                     ShopListIngredient, Tag)
 from .serializers import (FollowCreateSerializer, FollowSerializer,
                           IngredientSerializer, RecipesCreateSerializer, RecipesSerializer,
-                          TagSerializer, UserFollowSerializer,)
-from .utils import adding_obj_view, delete_obj_view
+                          TagSerializer,)
+from .utils import (adding_obj_view, attach_recipe_previews, delete_obj_view,
+                    get_recipes_limit)
+from .mixins import NANOSECONDS, ConditionalGetMixin
 from .pagination import CustomPageNumberPagination
+from .renderers import SHOPPING_LIST_RENDERERS
 
 
 class CustomUserViewSet(UserViewSet):
@@ -28,8 +41,12 @@ class CustomUserViewSet(UserViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = CustomPageNumberPagination
+    keyset_ordering = ('id',)
     permission_classes = (IsAuthenticated,)
 
+    def get_queryset(self):
+        return super().get_queryset().with_user_flags(self.request.user)
+
     @action(detail=True, methods=['POST'], url_path='subscribe')
     def user_subscribe_add(self, request, id):
         user = request.user
@@ -38,9 +55,13 @@ class CustomUserViewSet(UserViewSet):
             data={'user': user.id, 'following': id},
             context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        follow = get_object_or_404(Follow, user=user, following=following)
-        serializer = FollowSerializer(follow.following, context={'request': request})
+        with transaction.atomic():
+            serializer.save()
+            change_counter(CustomUser.objects.filter(pk=following.pk),
+                           'followers_count', 1)
+        get_user_state_version(user).bump_on_commit()
+        attach_recipe_previews([following], get_recipes_limit(request))
+        serializer = FollowSerializer(following, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @user_subscribe_add.mapping.delete
@@ -51,16 +72,22 @@ class CustomUserViewSet(UserViewSet):
                                      following=following).exists():
             return Response(['Вы не подписаны на этого пользователя'],
                             status=status.HTTP_400_BAD_REQUEST)
-        follow = Follow.objects.get(user=user, following=following)
-        follow.delete()
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(
+                user=user, following=following).delete()
+            change_counter(CustomUser.objects.filter(pk=following.pk),
+                           'followers_count', -deleted)
+        get_user_state_version(user).bump_on_commit()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['GET'], url_path='subscriptions', detail=False)
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = CustomUser.objects.filter(
+            following__user=user).order_by('id')
         pages = self.paginate_queryset(queryset)
-        serializer = UserFollowSerializer(
+        attach_recipe_previews(pages, get_recipes_limit(request))
+        serializer = FollowSerializer(
             pages,
             many=True,
             context={'request': request}
@@ -68,7 +95,7 @@ class CustomUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
@@ -76,8 +103,27 @@ class TagViewSet(viewsets.ModelViewSet):
     pagination_class = None
     search_fields = ['name']
 
+    def list(self, request, *args, **kwargs):
+        version = tags_cache.get_version()
+        return self.conditional_response(
+            ('tags', version, request.get_full_path()),
+            version / NANOSECONDS,
+            partial(self.list_tags, request, *args, **kwargs))
+
+    def list_tags(self, request, *args, **kwargs):
+        if request.query_params.get('search'):
+            return super().list(request, *args, **kwargs)
+        return Response(tags_cache.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        version = tags_cache.get_version()
+        return self.conditional_response(
+            ('tag', version, kwargs[self.lookup_field]),
+            version / NANOSECONDS,
+            partial(super().retrieve, request, *args, **kwargs))
 
-class IngredientViewSet(viewsets.ModelViewSet):
+
+class IngredientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
@@ -85,15 +131,99 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filterset_class = IngredientsFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        version = ingredients_cache.get_version()
+        return self.conditional_response(
+            ('ingredients', version, request.get_full_path()),
+            version / NANOSECONDS,
+            partial(self.list_ingredients, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        version = ingredients_cache.get_version()
+        return self.conditional_response(
+            ('ingredient', version, kwargs[self.lookup_field]),
+            version / NANOSECONDS,
+            partial(super().retrieve, request, *args, **kwargs))
+
+    def list_ingredients(self, request, *args, **kwargs):
+        """ Список ингредиентов отдаётся из кеша справочников, подсказки
+            по названию - из индекса в памяти процесса, если он включён
+            настройкой INGREDIENT_AUTOCOMPLETE_IN_MEMORY. """
+        name = request.query_params.get('name')
+        if not name:
+            return Response(ingredients_cache.all())
+        if settings.INGREDIENT_AUTOCOMPLETE_IN_MEMORY:
+            return Response(get_ingredient_index().search(
+                name, settings.INGREDIENT_AUTOCOMPLETE_LIMIT))
+        return super().list(request, *args, **kwargs)
 
-class RecipesViewSet(viewsets.ModelViewSet):
+
+class RecipesViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
     serializer_class = RecipesSerializer
-    queryset = Recipe.objects.all().order_by('-id')
+    queryset = Recipe.objects.all().order_by('-pub_date', '-id')
     filter_backends = [DjangoFilterBackend, ]
     filterset_class = RecipeFilter
     pagination_class = CustomPageNumberPagination
 
+    @property
+    def keyset_ordering(self):
+        params = self.request.query_params
+        if params.get('ordering') in RANKINGS:
+            return ('-rank', '-id')
+        if params.get('search', '').strip():
+            return ('-search_rank', '-id')
+        return ('-pub_date', '-id')
+
+    def get_queryset(self):
+        return super().get_queryset().with_related().with_user_flags(
+            self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """ Валидаторы списка считаются по версиям без запросов к
+            базе, чтобы не добавлять COUNT к страницам без подсчёта.
+            Список меняется при любом изменении и удалении рецептов и
+            их счётчиков (версия рецептов) и при пересчёте оценок. """
+        return self.conditional_response(
+            *self.get_validators(
+                request.get_full_path(), None,
+                [recipes_version.get(), recipe_scores_version.get()]),
+            partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        """ Рецепт сверяется по собственному updated_at, который
+            меняется при правке, изменении счётчиков и картинок, поэтому
+            изменения других рецептов его не затрагивают. """
+        recipe = get_object_or_404(Recipe.objects.only('updated_at'),
+                                   pk=kwargs[self.lookup_field])
+        return self.conditional_response(
+            *self.get_validators(recipe.pk, recipe.updated_at, []),
+            partial(super().retrieve, request, *args, **kwargs))
+
+    def get_validators(self, key, updated_at, versions):
+        """ Кроме versions и updated_at ответ зависит от справочников,
+            данных авторов и избранного, списка покупок и подписок
+            текущего пользователя. """
+        user = self.request.user
+        versions = [*versions,
+                    tags_cache.get_version(),
+                    ingredients_cache.get_version(),
+                    users_version.get()]
+        if user.is_authenticated:
+            versions.append(get_user_state_version(user).get())
+        last_modified = max(versions) / NANOSECONDS
+        if updated_at is not None:
+            last_modified = max(last_modified, updated_at.timestamp())
+        etag_parts = (key, user.id, updated_at, *versions)
+        return etag_parts, last_modified
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        remove_recipe_from_carts(instance)
+        instance.delete()
+        change_counter(CustomUser.objects.filter(pk=instance.author_id),
+                       'recipes_count', -1)
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PUT', 'PATCH'):
             return RecipesCreateSerializer
@@ -141,13 +271,23 @@ class RecipesViewSet(viewsets.ModelViewSet):
     @action(detail=False,
             url_path='download_shopping_cart',
             methods=['GET', 'POST'],
-            permission_classes=[permissions.IsAuthenticated])
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_cart_recipe(self, request):
-        """ Метод скачивания списка продуктов. """
-        ingredients_list = IngredientAmount.objects.filter(
-            recipe__cart_recipe__user=request.user
-        ).values('ingredient__name', 'ingredient__measurement_unit').order_by(
-            'ingredient__name').annotate(tolal_sum=Sum('amount'))
-        response = HttpResponse(ingredients_list, 'Content-Type: text/plain')
-        response['Content-Disposition'] = 'attachment; filename=cart_recipe'
+        """ Метод скачивания списка продуктов. Формат файла выбирается
+            параметром format: txt (по умолчанию), csv или pdf. """
+        ingredients_list = ShopListIngredient.objects.filter(
+            user=request.user, amount__gt=0
+        ).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).order_by('ingredient__name')
+        renderer = request.accepted_renderer
+        content_type = request.accepted_media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.render_rows(ingredients_list.iterator()),
+            content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename={renderer.get_filename()}')
         return response
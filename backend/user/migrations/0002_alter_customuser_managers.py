@@ -0,0 +1,20 @@
+# Generated by Django 3.2.13 on 2026-10-17 18:19
+
+from django.db import migrations
+import user.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', user.models.CustomUserManager()),
+            ],
+        ),
+    ]
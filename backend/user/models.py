@@ -1,5 +1,25 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
+
+
+class CustomUserQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        """ Аннотирует пользователей флагом is_subscribed
+            для пользователя user. """
+        from recipes.models import Follow
+
+        if user.is_anonymous:
+            return self.annotate(
+                is_subscribed=Value(False, output_field=models.BooleanField())
+            )
+        return self.annotate(is_subscribed=Exists(Follow.objects.filter(
+            user=user, following=OuterRef('pk'))))
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
 
 
 class CustomUser(AbstractUser):
@@ -8,9 +28,15 @@ class CustomUser(AbstractUser):
                                 verbose_name='Никнэйм')
     first_name = models.CharField(max_length=100, verbose_name='Имя')
     last_name = models.CharField(max_length=100, verbose_name='Фамилия')
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    objects = CustomUserManager()
+
     class Meta:
         ordering = ['id']
         verbose_name = 'Пользователь'
@@ -1,9 +1,8 @@
-from multiprocessing import context
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 
 from .models import CustomUser
-from recipes.models import Follow
+from .utils import get_following_ids
 
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -16,10 +15,9 @@ class CustomUserSerializer(serializers.ModelSerializer):
                   'is_subscribed',)
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(following=obj.id).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_following_ids(self.context.get('request'))
 
 
 class UsersCreateSerializer(UserCreateSerializer):
@@ -0,0 +1,15 @@
+from recipes.models import Follow
+
+
+def get_following_ids(request):
+    """ Возвращает множество id авторов, на которых подписан текущий
+        пользователь. Множество загружается одним запросом и хранится
+        в объекте запроса до его завершения. """
+    if request is None or request.user.is_anonymous:
+        return frozenset()
+    following_ids = getattr(request, '_following_ids', None)
+    if following_ids is None:
+        following_ids = frozenset(Follow.objects.filter(
+            user=request.user).values_list('following_id', flat=True))
+        request._following_ids = following_ids
+    return following_ids